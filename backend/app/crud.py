@@ -1,6 +1,11 @@
-from sqlalchemy.orm import Session
+import json
+import uuid
+
+from sqlalchemy.orm import Session, selectinload
 from . import models, schemas
 from .utils.ssr_loader import fetch_ssr_rate
+from .utils import bill_cache
+from .utils.bill_layout import DESC_LAYOUT_VERSION, describe_material
 from fastapi import HTTPException
 
 
@@ -18,6 +23,7 @@ def create_material(db: Session, material: schemas.MaterialCreate):
         gst_rate=material.gst_rate,
         final_rate=material.final_rate,
         total_amount=material.total_amount,
+        **describe_material(material.description, material.boq_item_no),
     )
     db.add(db_material)
     db.commit()
@@ -34,6 +40,77 @@ def get_materials(db: Session) -> list[models.Material]:
     )
 
 
+def iter_materials(db: Session, chunk_size: int = 500):
+    """
+    All materials in id order, read chunk_size rows at a time (keyset
+    paging on id) so at most one chunk is loaded. Rows already yielded
+    are expunged from the session; use a session of its own.
+    """
+    last_id = 0
+    while True:
+        chunk = (
+            db.query(models.Material)
+            .filter(models.Material.id > last_id)
+            .order_by(models.Material.id.asc())
+            .limit(chunk_size)
+            .all()
+        )
+        if not chunk:
+            return
+        yield from chunk
+        last_id = chunk[-1].id
+        del chunk
+        db.expunge_all()
+
+
+# stored layout read along with the bill columns (derived from them, so
+# not part of the cache key)
+LAYOUT_COLUMNS = ("desc_lines", "row_height", "item_text", "layout_version")
+
+
+def bill_rows(db: Session):
+    """Query for just the columns the bills are drawn from, in id order."""
+    columns = [
+        getattr(models.Material, c) for c in bill_cache.BILL_COLUMNS + LAYOUT_COLUMNS
+    ]
+    return db.query(*columns).order_by(models.Material.id.asc())
+
+
+def backfill_material_layout(db: Session, chunk_size: int = 500) -> int:
+    """
+    Store the description layout of materials created before it was
+    stored, or by an older DESC_LAYOUT_VERSION. Returns how many.
+
+    Every uvicorn worker runs this at startup: rows another worker has
+    locked are skipped (where the DB has row locks), the rest are taken
+    in id order.
+    """
+    stale = models.Material.layout_version.is_(None) | (
+        models.Material.layout_version != DESC_LAYOUT_VERSION
+    )
+    done = 0
+    while True:
+        chunk = (
+            db.query(models.Material)
+            .filter(stale)
+            .order_by(models.Material.id)
+            .limit(chunk_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not chunk:
+            return done
+        for m in chunk:
+            for name, value in describe_material(m.description, m.boq_item_no).items():
+                setattr(m, name, value)
+        db.commit()
+        done += len(chunk)
+
+
+def has_materials(db: Session) -> bool:
+    return db.query(models.Material.id).first() is not None
+
+
 def delete_material(db: Session, material_id: int) -> bool:
     obj = db.query(models.Material).get(material_id)
     if not obj:
@@ -80,3 +157,55 @@ def get_invoice(db: Session, invoice_id: int):
 
 def list_invoices(db: Session, skip: int = 0, limit: int = 50):
     return db.query(models.Invoice).order_by(models.Invoice.created_at.desc()).offset(skip).limit(limit).all()
+
+
+def invoices_for_export(db: Session, invoice_ids=None, date_from=None, date_to=None):
+    """Query for the invoices of a batch export (ids and/or created_at range), in id order."""
+    query = db.query(models.Invoice)
+    if invoice_ids is not None:
+        query = query.filter(models.Invoice.id.in_(invoice_ids))
+    if date_from is not None:
+        query = query.filter(models.Invoice.created_at >= date_from)
+    if date_to is not None:
+        query = query.filter(models.Invoice.created_at <= date_to)
+    return query.order_by(models.Invoice.id.asc())
+
+
+def iter_invoices(db: Session, query, chunk_size: int = 100):
+    """
+    The invoices of `query` (ordered by id) with their items and
+    materials, chunk_size at a time like iter_materials.
+    """
+    last_id = 0
+    while True:
+        chunk = (
+            query.filter(models.Invoice.id > last_id)
+            .options(selectinload(models.Invoice.items).joinedload(models.InvoiceItem.material))
+            .limit(chunk_size)
+            .all()
+        )
+        if not chunk:
+            return
+        yield from chunk
+        last_id = chunk[-1].id
+        del chunk
+        db.expunge_all()
+
+
+# ---------- RENDER JOBS ----------
+
+def create_render_job(db: Session, kind: str, params: dict) -> models.RenderJob:
+    job = models.RenderJob(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        params=json.dumps(params or {}),
+        status="queued",
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_render_job(db: Session, job_id: str):
+    return db.query(models.RenderJob).get(job_id)
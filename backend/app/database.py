@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -23,3 +24,29 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def add_missing_columns(table):
+    """
+    Add the nullable columns of `table` that its existing DB table lacks.
+    create_all() only creates missing tables, it doesn't alter old ones.
+
+    Every uvicorn worker runs this at startup, so one column at a time:
+    a column another worker added first (duplicate column error) is fine.
+    """
+    def column_names():
+        return {c["name"] for c in inspect(engine).get_columns(table.name)}
+
+    existing = column_names()
+    for column in table.columns:
+        if column.name in existing or not column.nullable:
+            continue
+        try:
+            with engine.begin() as conn:
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                    f"{column.type.compile(engine.dialect)}"
+                )
+        except DBAPIError:
+            if column.name not in column_names():
+                raise
@@ -1,26 +1,63 @@
 # app/main.py
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
 import io
-from reportlab.lib.pagesizes import A4, landscape
+import os
+from contextlib import asynccontextmanager
 from reportlab.pdfgen import canvas
-from textwrap import wrap
-import re
 
 from openpyxl import Workbook  # for Excel export
 
-from .database import SessionLocal, engine
+from .database import SessionLocal, add_missing_columns, engine
 from . import models, schemas, crud
-from .utils.ssr_loader import fetch_ssr_rate
+from .utils.ssr_loader import (
+    FUZZY_THRESHOLD,
+    fetch_ssr_rate,
+    get_cache_stats,
+    get_coalescing_stats,
+    get_match_stats,
+    get_ssr_boq_mapping,
+    match_ssr_batch,
+    match_ssr_candidates,
+    rate_payload,
+    suggest_ssr,
+)
 from .utils.boq_loader import fetch_boq_item_no   # <--- NEW IMPORT
+from .utils.catalog import catalogs
+from .utils import bill_cache, invoice_batch, measurement_sheet, process_pool, render_jobs
+from .utils.bill_excel import render_materials_bill_xlsx
+from .utils.bill_pdf import STREAM_CHUNK_ROWS, render_materials_bill, stream_materials_bill
 from fastapi import Request
 
 models.Base.metadata.create_all(bind=engine)
+add_missing_columns(models.Material.__table__)
+add_missing_columns(models.RenderJob.__table__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # load SSR/BOQ before the first request instead of during it,
+    # and follow edits of the JSON files if CATALOG_WATCH_INTERVAL is set
+    catalogs.current()
+    catalogs.start_watcher()
+    db = SessionLocal()
+    try:
+        crud.backfill_material_layout(db)
+    except Exception as e:
+        # bills lay out what's left on the fly; the next start retries
+        print(f"Material layout backfill failed: {e}")
+    finally:
+        db.close()
+    render_jobs.jobs.start()
+    yield
+    render_jobs.jobs.shutdown()
+    process_pool.shutdown()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -44,27 +81,14 @@ def root():
 
 
 # ---------- SSR preview (for rate popup in form) ----------
-@app.post("/ssr/rate", response_model=schemas.RateResponse)
-def preview_rate(req: schemas.RateRequest):
-    """
-    Strict SSR + BOQ behaviour:
+RATE_NOT_FOUND_DETAIL = "Item not found in SSR or BOQ for this description"
 
-    - Try STRICT SSR match:
-        - If found → return SSR item no, unit, rates, gst, amount, and BOQ item no (if exists).
-    - If NOT found in SSR:
-        - Try BOQ match:
-            - If BOQ description found → treat as NON SSR ITEM, return:
-                * ssr_item_no = "NON SSR ITEM"
-                * unit = "" (user will enter manually)
-                * rates = 0 (user will enter)
-                * boq_item_no = from BOQ
-                * non_ssr = True
-            - If not even in BOQ → raise 404.
-    """
-
-    ssr_info = fetch_ssr_rate(req.description, req.quantity)
-    boq_no = fetch_boq_item_no(req.description)
 
+def _rate_preview(ssr_info, boq_no):
+    """
+    Response body for one rate preview, or None when neither SSR nor BOQ
+    know the description (caller answers 404).
+    """
     # ---------- CASE 1: SSR FOUND (exact match) ----------
     if ssr_info is not None:
         return {
@@ -88,10 +112,156 @@ def preview_rate(req: schemas.RateRequest):
         }
 
     # ---------- CASE 3: Neither SSR nor BOQ have this description ----------
-    raise HTTPException(
-        status_code=404,
-        detail="Item not found in SSR or BOQ for this description",
-    )
+    return None
+
+
+@app.post("/ssr/rate", response_model=schemas.RateResponse)
+def preview_rate(req: schemas.RateRequest):
+    """
+    Strict SSR + BOQ behaviour:
+
+    - Try STRICT SSR match:
+        - If found → return SSR item no, unit, rates, gst, amount, and BOQ item no (if exists).
+    - If NOT found in SSR:
+        - Try BOQ match:
+            - If BOQ description found → treat as NON SSR ITEM, return:
+                * ssr_item_no = "NON SSR ITEM"
+                * unit = "" (user will enter manually)
+                * rates = 0 (user will enter)
+                * boq_item_no = from BOQ
+                * non_ssr = True
+            - If not even in BOQ → raise 404.
+    """
+
+    ssr_info = fetch_ssr_rate(req.description, req.quantity)
+    boq_no = fetch_boq_item_no(req.description)
+
+    preview = _rate_preview(ssr_info, boq_no)
+    if preview is None:
+        raise HTTPException(status_code=404, detail=RATE_NOT_FOUND_DETAIL)
+    return preview
+
+
+@app.post("/ssr/rate/batch", response_model=list[schemas.RateBatchItem])
+def preview_rate_batch(reqs: list[schemas.RateRequest]):
+    """
+    /ssr/rate for a whole pasted BOQ sheet in one call.
+
+    Returns one entry per request line, in order: status_code 200 with the
+    same body /ssr/rate would give (SSR or NON SSR ITEM), or status_code 404
+    with the detail message. Identical descriptions are looked up once and
+    large batches spread their fuzzy matching over worker processes.
+    """
+    descriptions = [r.description for r in reqs]
+    matches = match_ssr_batch(descriptions)
+    boq_nos = {d: fetch_boq_item_no(d) for d in dict.fromkeys(descriptions)}
+
+    results = []
+    for req, match in zip(reqs, matches):
+        ssr_info = rate_payload(*match, req.quantity) if match is not None else None
+        preview = _rate_preview(ssr_info, boq_nos[req.description])
+        if preview is None:
+            results.append({
+                "description": req.description,
+                "status_code": 404,
+                "detail": RATE_NOT_FOUND_DETAIL,
+            })
+        else:
+            results.append({
+                "description": req.description,
+                "status_code": 200,
+                "rate": preview,
+            })
+    return results
+
+
+@app.post("/ssr/candidates", response_model=list[schemas.SsrCandidate])
+def rate_candidates(req: schemas.CandidatesRequest):
+    """
+    The k best SSR rows for a description with their scores, BOQ item
+    nos and rates for req.quantity, best first - lets the user pick the
+    right row for a borderline description instead of re-submitting
+    edited text.
+
+    Only the row /ssr/rate returns for this description is `accepted`:
+    the first one, if it matched by key or scores >= FUZZY_THRESHOLD.
+    It is exactly what /ssr/rate gives; the BOQ item no of the others is
+    the one /ssr/rate gives once their SSR description is picked.
+    """
+    candidates = []
+    for row, boq_no, score, kind in match_ssr_candidates(req.description, req.k):
+        accepted = not candidates and (kind != "fuzzy" or score >= FUZZY_THRESHOLD)
+        if accepted:
+            boq_no = fetch_boq_item_no(req.description)
+        else:
+            boq_no = fetch_boq_item_no(row.description) or boq_no
+        candidates.append({
+            **_rate_preview(rate_payload(row, boq_no, req.quantity), boq_no),
+            "description": row.description,
+            "score": round(score, 4),
+            "match": kind,
+            "accepted": accepted,
+        })
+    return candidates
+
+
+@app.get("/ssr/suggest", response_model=list[schemas.SuggestItem])
+def suggest(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    Typeahead for the description box: SSR items whose description
+    contains every typed word as a word prefix (last word may be
+    half typed), best first. Served from an index built at catalogue
+    load, no fuzzy matching.
+    """
+    return suggest_ssr(q, limit)
+
+
+@app.get("/ssr/stats")
+def ssr_stats():
+    """
+    How SSR lookups were resolved since start-up (exact / canonical /
+    fuzzy / not found), to see how many fuzzy scans are being avoided,
+    the match result cache counters (for sizing SSR_RATE_CACHE_SIZE),
+    how many cache misses joined an identical lookup already in flight,
+    and the loaded catalogue version.
+    """
+    return {
+        "matching": get_match_stats(),
+        "rate_cache": get_cache_stats(),
+        "coalescing": get_coalescing_stats(),
+        "catalog": catalogs.stats(),
+    }
+
+
+@app.get("/mapping")
+def ssr_boq_mapping(include_unmapped: bool = False):
+    """
+    SSR item -> BOQ item table the rate lookups use, computed once per
+    catalogue load (same description; several BOQ rows are told apart by
+    additional specification vs BOQ reference page, else the first).
+    `rule` says which case decided each row and `rules` counts them.
+    """
+    return get_ssr_boq_mapping(include_unmapped)
+
+
+@app.post("/admin/catalog/reload")
+def reload_catalog():
+    """
+    Re-read ssr_data.json / BOQ.json (or their snapshot) without restarting.
+
+    The new catalogue is built while requests keep using the current one,
+    then swapped in; lookups already running finish on the old version.
+    Only reaches the worker that serves this request - set
+    CATALOG_WATCH_INTERVAL to have every worker follow file changes.
+    """
+    try:
+        catalogs.reload()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Catalog reload failed: {e}")
+    return catalogs.stats()
 
 
 
@@ -123,441 +293,183 @@ def remove_material(material_id: int, db: Session = Depends(get_db)):
 # ============================================================
 #  FULL MATERIALS BILL (ALL ITEMS) - PDF
 # ============================================================
-@app.get("/materials/bill/pdf")
-def download_materials_bill(db: Session = Depends(get_db)):
-    materials = crud.get_materials(db)
-    if not materials:
-        raise HTTPException(status_code=400, detail="No materials to include in bill")
-
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=landscape(A4))
-    width, height = landscape(A4)
-
-    margin_left = 30
-    margin_right = width - 30
-    table_width = margin_right - margin_left
-
-    # -------- COLUMN POSITIONS (11 vertical lines = 10 columns) ----------
-    col1_x  = margin_left
-    col2_x  = col1_x + 35   # 1
-    col3_x  = col2_x + 35   # 2
-    col4_x  = col3_x + 55   # 3
-    col5_x  = col4_x + 75   # 4 (Quantity)
-    col6_x  = col5_x + 210  # 5 (Items of work)
-    col7_x  = col6_x + 60   # 6 (Rate)
-    col8_x  = col7_x + 70   # 7 (Unit)
-    col9_x  = col8_x + 70   # 8 (Amt Up-to-date)
-    col10_x = col9_x + 60   # 9 (Amt Since previous bill)
-    last_x  = margin_right  # 10 (Remarks)
-
-    line_h = 10
-
-    def ensure_space(h_needed: float):
-        """Start new page if not enough space for h_needed."""
-        nonlocal y
-        if y - h_needed < 110:
-            p.showPage()
-            draw_header()
-
-    def draw_header():
-        nonlocal y
-        p.setFont("Helvetica-Bold", 11)
-        y = height - 55
-        p.drawCentredString(width / 2, y, "Part I - Account of work executed")
-        y -= 8
-
-        header_top = y
-        header_bottom = header_top - (3 * line_h)  # 3 text rows
-        row2_y = header_top - line_h
-        row3_y = header_top - 2 * line_h
-
-        # outer rectangle
-        p.setLineWidth(0.5)
-        p.rect(margin_left, header_bottom, table_width, header_top - header_bottom)
-
-        # vertical lines
-        for x in [col1_x, col2_x, col3_x, col4_x, col5_x,
-                  col6_x, col7_x, col8_x, col9_x, col10_x, last_x]:
-            p.line(x, header_bottom, x, header_top)
-
-        # horizontal lines to split 3 header rows
-        p.line(margin_left, row2_y, margin_right, row2_y)
-        p.line(margin_left, row3_y, margin_right, row3_y)
-
-        # ---------- HEADER TEXT ----------
-        p.setFont("Helvetica-Bold", 7)
-
-        # Row 1 – grouped headings
-        # cols 1–3 : Advance payments...
-        p.drawCentredString(
-            (col1_x + col4_x) / 2,
-            header_top - 3,
-            "Advance payments, for work"
-        )
-        p.drawCentredString(
-            (col1_x + col4_x) / 2,
-            header_top - 3 - line_h,
-            "done not yet measured"
-        )
-
-        # col 4 : Quantity executed…
-        p.drawCentredString(
-            (col4_x + col5_x) / 2,
-            header_top - 3,
-            "Quantity"
-        )
-        p.drawCentredString(
-            (col4_x + col5_x) / 2,
-            header_top - 3 - line_h,
-            "executed up-"
-        )
-        p.drawCentredString(
-            (col4_x + col5_x) / 2,
-            header_top - 3 - 2 * line_h,
-            "to date as per"
-        )
-        p.drawCentredString(
-            (col4_x + col5_x) / 2,
-            header_top - 3 - 3 * line_h,
-            "measurement book"
-        )
-
-        # col 5 : Items of work
-        p.drawCentredString(
-            (col5_x + col6_x) / 2,
-            header_top - 3,
-            "Items of work"
-        )
-        p.drawCentredString(
-            (col5_x + col6_x) / 2,
-            header_top - 3 - line_h,
-            "(Grouped Under Sub-heads or Sub-works of estimate)"
-        )
-
-        # col 6 : Rate
-        p.drawCentredString(
-            (col6_x + col7_x) / 2,
-            header_top - 3,
-            "Rate"
-        )
-        p.drawCentredString(
-            (col6_x + col7_x) / 2,
-            header_top - 3 - line_h,
-            "(Total fees payable)"
-        )
+BILL_MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
 
-        # col 7 : Unit
-        p.drawCentredString(
-            (col7_x + col8_x) / 2,
-            header_top - 3,
-            "Unit"
-        )
 
-        # cols 8–9 : Payment on the basis...
-        p.drawCentredString(
-            (col8_x + col10_x) / 2,
-            header_top - 3,
-            "Payment on the basis of actual"
-        )
-        p.drawCentredString(
-            (col8_x + col10_x) / 2,
-            header_top - 3 - line_h,
-            "measurements"
-        )
-
-        # col 10 : Remarks...
-        p.drawCentredString(
-            (col10_x + last_x) / 2,
-            header_top - 3,
-            "Remarks"
-        )
-        p.drawCentredString(
-            (col10_x + last_x) / 2,
-            header_top - 3 - line_h,
-            "(with reasons for delay in"
-        )
-        p.drawCentredString(
-            (col10_x + last_x) / 2,
-            header_top - 3 - 2 * line_h,
-            "adjusting payments shown"
-        )
-        p.drawCentredString(
-            (col10_x + last_x) / 2,
-            header_top - 3 - 3 * line_h,
-            "in column (1)"
-        )
-
-        # Row 2 – sub-headings for cols 1–3 and 8–9
-        p.setFont("Helvetica-Bold", 7)
-
-        # col1
-        p.drawCentredString(
-            (col1_x + col2_x) / 2,
-            row3_y + 3,
-            "Total as"
-        )
-        p.drawCentredString(
-            (col1_x + col2_x) / 2,
-            row3_y + 3 - line_h,
-            "per previous"
-        )
-        p.drawCentredString(
-            (col1_x + col2_x) / 2,
-            row3_y + 3 - 2 * line_h,
-            "bill"
-        )
+def _cached_bill_response(request: Request, kind: str, key: str, render=None):
+    """
+    The materials bill of `kind` ("pdf" / "xlsx") whose bill_cache key is
+    `key`: 304 if the client already has it (If-None-Match), else the
+    cached file, rendered with render() and stored first if it is not
+    cached yet. None when it isn't cached and no render is given.
+    """
+    headers = {"ETag": f'"{key}"'}
+    if bill_cache.etag_matches(request.headers.get("if-none-match"), key):
+        return Response(status_code=304, headers=headers)
 
-        # col2
-        p.drawCentredString(
-            (col2_x + col3_x) / 2,
-            row3_y + 3,
-            "Since"
-        )
-        p.drawCentredString(
-            (col2_x + col3_x) / 2,
-            row3_y + 3 - line_h,
-            "previous"
-        )
-        p.drawCentredString(
-            (col2_x + col3_x) / 2,
-            row3_y + 3 - 2 * line_h,
-            "bill"
-        )
+    if render is not None:
+        path = bill_cache.get_or_render(key, kind, render)
+    else:
+        path = bill_cache.lookup(key, kind)
+        if path is None:
+            return None
+    return FileResponse(
+        path,
+        media_type=BILL_MEDIA_TYPES[kind],
+        filename=f"materials_bill.{kind}",
+        headers=headers,
+    )
 
-        # col3
-        p.drawCentredString(
-            (col3_x + col4_x) / 2,
-            row3_y + 3,
-            "Total up-"
-        )
-        p.drawCentredString(
-            (col3_x + col4_x) / 2,
-            row3_y + 3 - line_h,
-            "to date"
-        )
 
-        # col8 / 9
-        p.drawCentredString(
-            (col8_x + col9_x) / 2,
-            row3_y + 3,
-            "Up-to-date"
-        )
-        p.drawCentredString(
-            (col9_x + col10_x) / 2,
-            row3_y + 3,
-            "Since previous bill"
-        )
+@app.get("/materials/bill/pdf")
+def download_materials_bill(request: Request, stream: bool = False, db: Session = Depends(get_db)):
+    headers = {"Content-Disposition": "attachment; filename=materials_bill.pdf"}
+
+    if stream:
+        if not crud.has_materials(db):
+            raise HTTPException(status_code=400, detail="No materials to include in bill")
+
+        # an already generated bill is sent as is; it's not stored from
+        # here, rows added while streaming would not match its key
+        if bill_cache.ENABLED:
+            key = bill_cache.bill_key("pdf", crud.bill_rows(db).yield_per(STREAM_CHUNK_ROWS))
+            cached = _cached_bill_response(request, "pdf", key)
+            if cached is not None:
+                return cached
+
+        # pages go out while later rows are still being read: the
+        # generator has its own session since it outlives this request's
+        def pdf_pages():
+            stream_db = SessionLocal()
+            try:
+                yield from stream_materials_bill(
+                    crud.iter_materials(stream_db, STREAM_CHUNK_ROWS)
+                )
+            finally:
+                stream_db.close()
+
+        return StreamingResponse(pdf_pages(), media_type="application/pdf", headers=headers)
+
+    rows = crud.bill_rows(db).all()
+    if not rows:
+        raise HTTPException(status_code=400, detail="No materials to include in bill")
 
-        # Row 3 – column numbers 1..10
-        num_y = header_bottom + 2
-        for idx, (xl, xr) in enumerate(
-            [
-                (col1_x, col2_x),
-                (col2_x, col3_x),
-                (col3_x, col4_x),
-                (col4_x, col5_x),
-                (col5_x, col6_x),
-                (col6_x, col7_x),
-                (col7_x, col8_x),
-                (col8_x, col9_x),
-                (col9_x, col10_x),
-                (col10_x, last_x),
-            ],
-            start=1,
-        ):
-            p.drawCentredString((xl + xr) / 2, num_y, str(idx))
-
-        y = header_bottom - 14
-        p.setFont("Helvetica", 8)
-
-    # -------- START FIRST PAGE --------
-    draw_header()
-
-    grand_without_18 = 0.0
-
-    for m in materials:
-        qty = float(m.quantity or 0.0)
-        amount = float(m.total_amount or 0.0)
-        base_rate = float(m.base_rate or 0.0)
-        unit = (m.unit or "").strip()
-        # use saved BOQ item no; fallback "-" if not present
-        boq_no = (getattr(m, "boq_item_no", "") or "").strip() or "-"
-
-        # clean + wrap description
-        raw_desc = m.description or ""
-        clean_desc = re.sub(r"\s+", " ", raw_desc.replace("\n", " ").replace("\r", " ")).strip()
-        desc_lines = wrap(clean_desc, 90) or [""]
-
-        # height = one top line + all desc lines + padding
-        row_height = line_h * (1 + len(desc_lines)) + 10
-
-        ensure_space(row_height + 4)
-
-        top_y = y
-        bottom_y = y - row_height
-
-        # row rectangle & verticals
-        p.rect(margin_left, bottom_y, table_width, row_height)
-        for x in [col1_x, col2_x, col3_x, col4_x, col5_x,
-                  col6_x, col7_x, col8_x, col9_x, col10_x, last_x]:
-            p.line(x, bottom_y, x, top_y)
-
-        # text baseline a bit lower to avoid touching borders
-        text_y = top_y - 6
-
-        # column 4 → Quantity
-        p.drawRightString(col5_x - 3, text_y, f"{qty:.3f}")
-
-        # column 5 → "Item No. X" and description
-        p.setFont("Helvetica-Bold", 8)
-        p.drawString(col5_x + 2, text_y, f"Item No. {boq_no}")
-        p.setFont("Helvetica", 8)
-        desc_y = text_y - line_h
-        for line in desc_lines:
-            p.drawString(col5_x + 2, desc_y, line)
-            desc_y -= line_h
-
-        # column 6 → Rate
-        p.drawRightString(col6_x + 55, text_y, f"{base_rate:.2f}")
-        # column 7 → Unit
-        p.drawString(col7_x + 2, text_y, unit)
-        # columns 8 & 9 → Amount (same)
-        p.drawRightString(col8_x + 65, text_y, f"{amount:.2f}")
-        p.drawRightString(col9_x + 55, text_y, f"{amount:.2f}")
-        # column 10 → Remarks blank
-
-        grand_without_18 += amount
-        # small gap between rows
-        y = bottom_y - 4
-
-    # ---------- TOTALS + 18% GST ----------
-    ensure_space(7 * line_h + 30)
-
-    gst_18 = round(grand_without_18 * 0.18, 2)
-    total_with_18 = round(grand_without_18 + gst_18, 2)
-
-    def total_row(label: str, val: float, bold: bool = False):
-        nonlocal y
-        p.setFont("Helvetica-Bold" if bold else "Helvetica", 8)
-        p.drawString(col5_x + 2, y, label)
-        p.drawRightString(col8_x + 65, y, f"{val:.2f}")
-        p.drawRightString(col9_x + 55, y, f"{val:.2f}")
-        y -= line_h
-
-    total_row("A)", grand_without_18, bold=True)
-    total_row("(-)", 0.0)
-    total_row("", grand_without_18)
-    total_row("18% GST", gst_18)
-    total_row("Total", total_with_18, bold=True)
-    total_row("Price Escallation", 0.0)
-    total_row("Grand Total", total_with_18, bold=True)
-
-    # ---------- SIGNATURE BLOCK ----------
-    if y < 90:
-        p.showPage()
-        y = height - 100
-
-    p.setFont("Helvetica", 9)
-    p.drawString(margin_left, 70, "Deputy Engineer,")
-    p.drawString(margin_left, 58, "Bandra (P.W.) Project Sub Division No. 2")
-    p.drawString(margin_left, 46, "Bandra")
-
-    p.drawString(width - 260, 70, "Executive Engineer,")
-    p.drawString(width - 260, 58, "North Mumbai Division,")
-    p.drawString(width - 260, 46, "Andheri, Mumbai.")
-
-    p.showPage()
-    p.save()
-    buffer.seek(0)
+    if bill_cache.ENABLED:
+        key = bill_cache.bill_key("pdf", rows)
+        return _cached_bill_response(request, "pdf", key, lambda: render_materials_bill(rows))
 
     return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": "attachment; filename=materials_bill.pdf"},
+        io.BytesIO(render_materials_bill(rows)), media_type="application/pdf", headers=headers
     )
 
 # ============================================================
 #  FULL MATERIALS BILL (ALL ITEMS) - EXCEL
 # ============================================================
 @app.get("/materials/bill/excel")
-def download_materials_bill_excel(db: Session = Depends(get_db)):
-    materials = crud.get_materials(db)
-    if not materials:
+def download_materials_bill_excel(request: Request, db: Session = Depends(get_db)):
+    if not crud.has_materials(db):
         raise HTTPException(status_code=400, detail="No materials to include in bill")
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Materials Bill"
-
-    # Header row (10 columns)
-    # 1–3 blank, 4=Qty, 5=Item No + Desc, 6=Rate, 7=Unit, 8=Amount, 9=Amount, 10 blank
-    ws.append([
-        "", "", "",              # 1,2,3 blank
-        "Quantity",              # 4
-        "Items of work (Item No + Description)",  # 5
-        "Rate",                  # 6
-        "Unit",                  # 7
-        "Amount (Col 8)",        # 8
-        "Amount (Col 9)",        # 9
-        ""                       # 10 blank
-    ])
-
-    grand_without_18 = 0.0
-
-    for m in materials:
-        qty = float(m.quantity or 0.0)
-        amount = float(m.total_amount or 0.0)
-        base_rate = float(m.base_rate or 0.0)
-        unit = m.unit or ""
-        boq_no = getattr(m, "boq_item_no", "") or ""
-
-        desc = m.description or ""
-        item_label = f"Item No. {boq_no}".strip() if boq_no else "Item"
-        item_text = f"{item_label} - {desc}" if desc else item_label
-
-        grand_without_18 += amount
-
-        ws.append([
-            "", "", "",              # col1,2,3
-            qty,                     # col4
-            item_text,               # col5
-            base_rate,               # col6
-            unit,                    # col7
-            amount,                  # col8
-            amount,                  # col9
-            ""                       # col10
-        ])
-
-    # Totals section at the bottom (similar to PDF)
-    gst_18 = round(grand_without_18 * 0.18, 2)
-    total_with_18 = round(grand_without_18 + gst_18, 2)
-
-    ws.append([])  # blank row
-    ws.append(["", "", "", "", "A)", "", "", grand_without_18, grand_without_18, ""])
-    ws.append(["", "", "", "", "(-)", "", "", 0.0, 0.0, ""])
-    ws.append(["", "", "", "", "", "", "", grand_without_18, grand_without_18, ""])
-    ws.append(["", "", "", "", "18%", "", "", gst_18, gst_18, ""])
-    ws.append(["", "", "", "", "Total", "", "", total_with_18, total_with_18, ""])
-    ws.append(["", "", "", "", "Price Escallation", "", "", 0.0, 0.0, ""])
-    ws.append(["", "", "", "", "Grand Total", "", "", total_with_18, total_with_18, ""])
-
-    # Set number format for numeric columns (4,6,8,9)
-    for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=4, max_col=9):
-        for cell in row:
-            if isinstance(cell.value, (int, float)):
-                cell.number_format = "0.00"
-
-    # Save to memory
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+    # rows are read STREAM_CHUNK_ROWS at a time, never all at once
+    if bill_cache.ENABLED:
+        key = bill_cache.bill_key("xlsx", crud.bill_rows(db).yield_per(STREAM_CHUNK_ROWS))
+        cached = _cached_bill_response(request, "xlsx", key)
+        if cached is not None:
+            return cached
+
+        # stored under the key of the rows it was drawn from, in case
+        # materials changed since the key above
+        rows = bill_cache.KeyedRows("xlsx", crud.bill_rows(db).yield_per(STREAM_CHUNK_ROWS))
+        data = render_materials_bill_xlsx(rows)
+        bill_cache.store(rows.key, "xlsx", data)
+        # sent from memory: no second lookup that could miss the file
+        return Response(
+            data,
+            media_type=BILL_MEDIA_TYPES["xlsx"],
+            headers={
+                "ETag": f'"{rows.key}"',
+                "Content-Disposition": 'attachment; filename="materials_bill.xlsx"',
+            },
+        )
 
     return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        io.BytesIO(render_materials_bill_xlsx(crud.bill_rows(db).yield_per(STREAM_CHUNK_ROWS))),
+        media_type=BILL_MEDIA_TYPES["xlsx"],
         headers={"Content-Disposition": "attachment; filename=materials_bill.xlsx"},
     )
 
+# ============================================================
+#  BATCH INVOICE PDF EXPORT (ZIP or merged PDF)
+# ============================================================
+@app.post("/invoices/batch/pdf")
+def export_invoices_batch(req: schemas.InvoiceBatchExport, db: Session = Depends(get_db)):
+    try:
+        invoice_batch.check_request(req)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if crud.invoices_for_export(db, req.invoice_ids, req.date_from, req.date_to).first() is None:
+        raise HTTPException(status_code=404, detail="No invoices match")
+
+    def chunks():
+        # a session of its own: the request's one is closed once streaming starts
+        batch_db = SessionLocal()
+        try:
+            yield from invoice_batch.stream_batch(batch_db, req)
+        finally:
+            batch_db.close()
+
+    filename, media_type = invoice_batch.FORMATS[req.format]
+    return StreamingResponse(
+        chunks(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+@app.get("/invoices/batch/stats")
+def invoice_batch_stats():
+    return invoice_batch.get_batch_stats()
+
+# ============================================================
+#  BACKGROUND RENDER JOBS (large bills)
+# ============================================================
+@app.post("/jobs", response_model=schemas.RenderJob, status_code=202)
+def submit_render_job(req: schemas.RenderJobCreate, db: Session = Depends(get_db)):
+    try:
+        return render_jobs.jobs.submit(db, req.kind, req.params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except render_jobs.JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+
+
+@app.get("/jobs/stats")
+def render_job_stats():
+    return render_jobs.jobs.stats()
+
+
+@app.get("/jobs/{job_id}", response_model=schemas.RenderJob)
+def get_render_job(job_id: str, db: Session = Depends(get_db)):
+    job = crud.get_render_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/download")
+def download_render_job(job_id: str, db: Session = Depends(get_db)):
+    job = crud.get_render_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if not os.path.exists(job.artifact_path):
+        raise HTTPException(status_code=410, detail="Job output has expired")
+    return FileResponse(job.artifact_path, media_type=job.media_type, filename=job.filename)
+
 # ============================================================
 #  SINGLE MATERIAL MEASUREMENT SHEET - PDF (SSR + BOQ + NON-SSR)
 # ============================================================
@@ -571,164 +483,17 @@ def download_single_material_bill(req: schemas.MaterialSingleBillRequest):
     - If SSR not found -> label 'NON SSR ITEM' and no unit.
     """
 
-    # ---------- Normalize entries ----------
-    entries = []
-    if getattr(req, "entries", None):
-        entries = list(req.entries)
-
-    if not entries and any(
-        v is not None
-        for v in [req.no_of_items, req.length, req.breadth, req.depth, req.quantity]
-    ):
-        entries.append(
-            schemas.MaterialMeasurementEntry(
-                pile_description=None,
-                no_of_items=req.no_of_items,
-                length=req.length,
-                breadth=req.breadth,
-                depth=req.depth,
-                quantity=req.quantity,
-            )
-        )
-
+    entries = measurement_sheet.item_entries(req)
     if not entries:
         raise HTTPException(status_code=400, detail="No measurement entries provided")
 
-    # ---------- Compute total quantity ----------
-    total_qty = 0.0
-    normalized_entries = []
-    for e in entries:
-        no_val = e.no_of_items or 0
-        b_val = e.breadth or 0
-        d_val = e.depth or 0
-        l_val = e.length or 0
-
-        q_val = e.quantity
-        if q_val is None:
-            q_val = (no_val or 0) * (l_val or 0) * (b_val or 0) * (d_val or 0)
-
-        total_qty += q_val
-
-        normalized_entries.append(
-            {
-                "pile_description": e.pile_description or "",
-                "no": no_val,
-                "b": b_val,
-                "d": d_val,
-                "l": l_val,
-                "q": q_val,
-            }
-        )
-
-    # ---------- SSR & BOQ lookups ----------
-    ssr_item_no = ""
-    unit_str = ""
-    non_ssr = False
-
-    if total_qty > 0:
-        ssr_info = fetch_ssr_rate(req.description, total_qty)
-        if ssr_info is None:
-            non_ssr = True
-        else:
-            ssr_item_no = ssr_info.get("ssr_item_no", "") or ""
-            unit_str = ssr_info.get("unit", "") or ""
-    else:
-        non_ssr = True
-
-    boq_item_no = fetch_boq_item_no(req.description) or ""
+    rows, total_qty = measurement_sheet.pdf_rows(entries)
+    lookup = measurement_sheet.lookup_sheet(req.description, total_qty)
 
     # ---------- PDF build ----------
     buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    y = height - 40
-    p.setFont("Helvetica-Bold", 11)
-    p.drawString(40, y, "Item Measurement Sheet")
-    y -= 18
-
-    # Item description
-    p.setFont("Helvetica", 9)
-    header_text = f"Item Description (from SSR / BOQ): {req.description}"
-    header_lines = wrap(header_text, 110)
-    for line in header_lines:
-        p.drawString(40, y, line)
-        y -= 12
-
-    y -= 4
-    p.setFont("Helvetica-Bold", 9)
-    if non_ssr:
-        p.drawString(40, y, "SSR Item No: NON SSR ITEM")
-    else:
-        p.drawString(40, y, f"SSR Item No: {ssr_item_no or '-'}")
-    y -= 12
-    p.drawString(40, y, f"BOQ Item No: {boq_item_no or '-'}")
-    y -= 16
-
-    # Table header
-    p.setFont("Helvetica-Bold", 9)
-    p.drawString(40,  y, "Sr.")
-    p.drawString(60,  y, "Pile Description")
-    p.drawString(240, y, "No")
-    p.drawString(285, y, "B")
-    p.drawString(325, y, "D")
-    p.drawString(365, y, "L")
-    p.drawString(405, y, "Unit")
-    p.drawString(460, y, "Quantity")
-    y -= 12
-    p.line(40, y, 560, y)
-    y -= 8
-
-    p.setFont("Helvetica", 8)
-    line_height = 12
-
-    for idx, row in enumerate(normalized_entries, start=1):
-        if y - line_height < 60:
-            p.showPage()
-            y = height - 80
-            p.setFont("Helvetica-Bold", 9)
-            p.drawString(40,  y, "Sr.")
-            p.drawString(60,  y, "Pile Description")
-            p.drawString(240, y, "No")
-            p.drawString(285, y, "B")
-            p.drawString(325, y, "D")
-            p.drawString(365, y, "L")
-            p.drawString(405, y, "Unit")
-            p.drawString(460, y, "Quantity")
-            y -= 12
-            p.line(40, y, 560, y)
-            y -= 8
-            p.setFont("Helvetica", 8)
-
-        pile_desc = row["pile_description"].replace("\n", " ").strip()
-        if len(pile_desc) > 35:
-            pile_desc = pile_desc[:35] + "..."
-
-        p.drawString(40, y, str(idx))
-        p.drawString(60, y, pile_desc)
-        p.drawRightString(270, y, f"{row['no']:.3f}")
-        p.drawRightString(310, y, f"{row['b']:.3f}")
-        p.drawRightString(350, y, f"{row['d']:.3f}")
-        p.drawRightString(390, y, f"{row['l']:.3f}")
-
-        p.drawString(405, y, unit_str if not non_ssr else "")
-
-        p.drawRightString(540, y, f"{row['q']:.3f}")
-
-        y -= line_height
-
-    # Total
-    if y < 60:
-        p.showPage()
-        y = height - 80
-
-    p.setFont("Helvetica-Bold", 9)
-    p.line(380, y, 560, y)
-    y -= 12
-    p.drawRightString(500, y, "Total Quantity:")
-    p.drawRightString(560, y, f"{total_qty:.3f}")
-
-    p.showPage()
+    p = canvas.Canvas(buffer, pagesize=measurement_sheet.PAGE_SIZE)
+    measurement_sheet.draw_measurement_sheet(p, req.description, rows, total_qty, lookup)
     p.save()
     buffer.seek(0)
 
@@ -759,63 +524,12 @@ def download_single_material_bill_excel(
         raise HTTPException(status_code=400, detail="No measurement entries provided")
 
     # Recompute quantity row-wise as No × L × B × D (same as frontend)
-    rows = []
-    for idx, e in enumerate(req.entries, start=1):
-        no_ = float(e.no_of_items or 0)
-        L = float(e.length or 0)
-        B = float(e.breadth or 0)
-        D = float(e.depth or 0)
-        qty = no_ * L * B * D
-        rows.append(
-            {
-                "sr": idx,
-                "pile_description": e.pile_description or "",
-                "no_of_items": no_,
-                "length": L,
-                "breadth": B,
-                "depth": D,
-                "quantity": qty,
-            }
-        )
+    rows = measurement_sheet.excel_rows(req.entries)
 
-    # Create Excel workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Material Measurement"
-
-    # Header: item description on top
-    ws["A1"] = "Item Description:"
-    ws["B1"] = req.description
-
-    # Table header (start at row 3)
-    header_row = 3
-    headers = [
-        "Sr. No.",
-        "Pile Description",
-        "No",
-        "Length",
-        "Breadth",
-        "Depth",
-        "Quantity",
-    ]
-    for col_idx, title in enumerate(headers, start=1):
-        ws.cell(row=header_row, column=col_idx, value=title)
-
-    # Data rows (from row 4 onwards)
-    excel_row = header_row + 1
-    for r in rows:
-        ws.cell(row=excel_row, column=1, value=r["sr"])
-        ws.cell(row=excel_row, column=2, value=r["pile_description"])
-        ws.cell(row=excel_row, column=3, value=r["no_of_items"])
-        ws.cell(row=excel_row, column=4, value=r["length"])
-        ws.cell(row=excel_row, column=5, value=r["breadth"])
-        ws.cell(row=excel_row, column=6, value=r["depth"])
-        ws.cell(row=excel_row, column=7, value=r["quantity"])
-        excel_row += 1
-
-    # Autosize a bit (simple version)
-    for col in range(1, 8):
-        ws.column_dimensions[chr(64 + col)].width = 18
+    # Create Excel workbook (write-only: rows are written as appended)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Material Measurement")
+    measurement_sheet.write_measurement_sheet(ws, req.description, rows)
 
     # Save to buffer
     buffer = io.BytesIO()
@@ -830,4 +544,76 @@ def download_single_material_bill_excel(
         headers={
             "Content-Disposition": 'attachment; filename="single_material_bill.xlsx"'
         },
-    )
\ No newline at end of file
+    )
+
+# ============================================================
+#  MEASUREMENT BOOK - many items' sheets in one PDF / workbook
+# ============================================================
+def _measurement_book_entries(req: schemas.MeasurementBookRequest) -> list:
+    if not req.items:
+        raise HTTPException(status_code=400, detail="No items provided")
+    entries = [measurement_sheet.item_entries(item) for item in req.items]
+    for idx, item_entries in enumerate(entries, start=1):
+        if not item_entries:
+            raise HTTPException(
+                status_code=400, detail=f"Item {idx}: No measurement entries provided"
+            )
+    return entries
+
+
+@app.post("/materials/measurement-book/pdf")
+def download_measurement_book(req: schemas.MeasurementBookRequest):
+    """
+    The measurement sheets of many items (same body per item as
+    /materials/single-bill/pdf) as one PDF, a section per item starting
+    on a new page, with a bookmark per item.
+    """
+    entries = _measurement_book_entries(req)
+    sheets = [measurement_sheet.pdf_rows(item_entries) for item_entries in entries]
+    lookups = measurement_sheet.lookup_sheets(
+        [(item.description, total_qty) for item, (_, total_qty) in zip(req.items, sheets)]
+    )
+
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=measurement_sheet.PAGE_SIZE)
+    for idx, (item, (rows, total_qty), lookup) in enumerate(zip(req.items, sheets, lookups), start=1):
+        key = f"item{idx}"
+        p.bookmarkPage(key)
+        p.addOutlineEntry(measurement_sheet.sheet_title(idx, item.description), key)
+        measurement_sheet.draw_measurement_sheet(p, item.description, rows, total_qty, lookup)
+    p.save()
+    buffer.seek(0)
+
+    return StreamingResponse(
+        buffer,
+        media_type="application/pdf",
+        headers={"Content-Disposition": "attachment; filename=measurement_book.pdf"},
+    )
+
+
+@app.post("/materials/measurement-book/excel")
+def download_measurement_book_excel(req: schemas.MeasurementBookRequest):
+    """
+    The measurement sheets of many items as one workbook, a worksheet per
+    item laid out as /materials/single-bill/excel.
+    """
+    entries = _measurement_book_entries(req)
+
+    wb = Workbook(write_only=True)
+    for idx, (item, item_entries) in enumerate(zip(req.items, entries), start=1):
+        ws = wb.create_sheet(measurement_sheet.sheet_title(idx, item.description))
+        measurement_sheet.write_measurement_sheet(
+            ws, item.description, measurement_sheet.excel_rows(item_entries)
+        )
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    buffer.seek(0)
+
+    return StreamingResponse(
+        buffer,
+        media_type=(
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        ),
+        headers={"Content-Disposition": 'attachment; filename="measurement_book.xlsx"'},
+    )
@@ -21,6 +21,13 @@ class Material(Base):
     gst_rate = Column(Float, default=0)
     final_rate = Column(Float, default=0)
     total_amount = Column(Float, default=0)
+
+    # description as laid out on the bills, see utils/bill_layout.py
+    clean_description = Column(Text, nullable=True)
+    desc_lines = Column(Text, nullable=True)            # wrapped lines, "\n"-joined
+    row_height = Column(Float, nullable=True)
+    item_text = Column(Text, nullable=True)             # "Item No. X - description"
+    layout_version = Column(Integer, nullable=True)
     # 🔹 important: match InvoiceItem.material back_populates
     invoice_items = relationship("InvoiceItem", back_populates="material")
 
@@ -49,3 +56,24 @@ class InvoiceItem(Base):
 
     invoice = relationship("Invoice", back_populates="items")
     material = relationship("Material", back_populates="invoice_items")
+
+
+class RenderJob(Base):
+    """A background export (see utils/render_jobs.py) and its artifact."""
+    __tablename__ = "render_jobs"
+
+    id = Column(String, primary_key=True, index=True)   # uuid4 hex
+    kind = Column(String, nullable=False)               # e.g. materials_bill_pdf
+    params = Column(Text, nullable=True)                # JSON
+    status = Column(String, default="queued", index=True)  # queued / running / done / failed
+    error = Column(Text, nullable=True)
+
+    artifact_path = Column(String, nullable=True)
+    filename = Column(String, nullable=True)
+    media_type = Column(String, nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+
+    boot_id = Column(String, nullable=True)             # RenderJobQueue.boot_id of the process running it
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -1,8 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
-import os
-import tempfile
 from datetime import datetime
 
 from app.database import get_db
@@ -66,24 +64,8 @@ def generate_invoice_pdf(invoice_id: int, template_type: str = "standard", db: S
             'template_type': template_type
         }
         
-        # Create temporary file for PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            output_path = tmp_file.name
-        
-        # Generate PDF based on template type
-        if template_type == "detailed":
-            pdf_path = pdf_generator.generate_detailed_invoice(invoice_data, output_path)
-        elif template_type == "simplified":
-            pdf_path = pdf_generator.generate_simplified_invoice(invoice_data, output_path)
-        else:
-            pdf_path = pdf_generator.generate_standard_invoice(invoice_data, output_path)
-        
-        # Read the generated PDF
-        with open(pdf_path, 'rb') as pdf_file:
-            pdf_content = pdf_file.read()
-        
-        # Clean up temporary file
-        os.unlink(pdf_path)
+        # Rendered in memory, no temp file
+        pdf_content = pdf_generator.render(invoice_data, template_type)
         
         # Return PDF as response
         from fastapi.responses import Response
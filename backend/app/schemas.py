@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
@@ -62,6 +62,62 @@ class RateResponse(BaseModel):
     boq_item_no: Optional[str] = None    # from BOQ.json if available
     non_ssr: bool = False    
 
+
+class RateBatchItem(BaseModel):
+    """
+    One line of POST /ssr/rate/batch: status_code 200 with the /ssr/rate
+    body in `rate`, or 404 with `detail`.
+    """
+    description: str
+    status_code: int = 200
+    rate: Optional[RateResponse] = None
+    detail: Optional[str] = None
+
+
+class CandidatesRequest(BaseModel):
+    description: str
+    quantity: float = 1.0
+    k: int = Field(5, ge=1, le=20)
+
+
+class SsrCandidate(RateResponse):
+    """
+    One of the top-k rows from POST /ssr/candidates. `accepted` marks the
+    row /ssr/rate returns (at most one: the first, if it matched by key
+    or scores >= fuzzy threshold).
+    """
+    description: str
+    score: float
+    match: str          # "exact" | "canonical" | "fuzzy"
+    accepted: bool
+
+class SuggestItem(BaseModel):
+    ssr_item_no: str
+    description: str
+    unit: str
+    rate: float
+
+
+
+class RenderJobCreate(BaseModel):
+    kind: str                      # materials_bill_pdf / _excel, invoice_batch_zip / _pdf
+    params: dict = Field(default_factory=dict)
+
+
+class RenderJob(BaseModel):
+    id: str
+    kind: str
+    status: str                    # queued / running / done / failed
+    error: Optional[str] = None
+    filename: Optional[str] = None
+    size_bytes: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
     
 # ---------- INVOICES (for later / your existing CRUD) ----------
 
@@ -103,6 +159,15 @@ class Invoice(InvoiceBase):
     class Config:
         from_attributes = True
 
+
+class InvoiceBatchExport(BaseModel):
+    # which invoices: these ids and/or those created in [date_from, date_to]
+    invoice_ids: Optional[List[int]] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    template_type: str = "standard"   # standard / detailed / simplified
+    format: str = "zip"               # zip (one PDF per invoice) / pdf (merged)
+
 class MaterialMeasurementEntry(BaseModel):
     pile_description: Optional[str] = None
     no_of_items: Optional[float] = None
@@ -122,6 +187,10 @@ class MaterialSingleBillRequest(BaseModel):
     # multi-row mode
     entries: Optional[List[MaterialMeasurementEntry]] = None
 
+class MeasurementBookRequest(BaseModel):
+    """Many items' measurement sheets in one export (/materials/measurement-book/...)."""
+    items: List[MaterialSingleBillRequest]
+
 class SingleMaterialBillEntry(BaseModel):
     """
     One measurement row in the individual material bill:
@@ -0,0 +1,138 @@
+"""
+Render time and size of the materials bill PDF.
+
+Run from backend/:
+
+    python -m app.utils.bench_bill_pdf [--rows 5000] [--repeat 3]
+                                       [--workers 1 2 4 8]
+
+The rows are synthetic materials with SSR descriptions, laid out as
+crud.create_material stores them (no database needed). Each mode
+renders the whole bill: "buffered" is the normal Canvas of
+/materials/bill/pdf, "stream" the StreamingCanvas of ?stream=true;
+"+forms" stamps the header and row grid as form XObjects (the default),
+without it they are drawn out on every page / row.
+
+The second table is render_materials_bill with the bill split into N
+page ranges, drawn in the shared process pool (set POOL_WORKERS to the
+largest N to run them all at once). Besides the measured wall time it
+times the phases one after another - layout (wrapping + page breaks)
+and joining the pages are serial, the ranges run in parallel - so
+"N cores" = layout + slowest range + join is what the bill takes given
+N free cores, also on a smaller machine.
+"""
+
+import argparse
+import io
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from reportlab.pdfgen import canvas
+
+from . import bill_pdf
+from .bill_layout import describe_material
+from .bill_pdf import PAGE_SIZE, MaterialsBill, stream_materials_bill
+from .catalog import catalogs
+
+
+def _materials(rows: int) -> list:
+    ssr = catalogs.current().ssr
+    rnd = random.Random(1)
+    materials = []
+    for i in range(rows):
+        pos = rnd.randrange(len(ssr))
+        qty = round(rnd.uniform(1, 500), 3)
+        rate = float(ssr.rate[pos])
+        materials.append(SimpleNamespace(
+            description=ssr.description[pos],
+            boq_item_no=f"{i + 1}",
+            unit=ssr.unit[pos],
+            quantity=qty,
+            base_rate=rate,
+            total_amount=round(qty * rate, 2),
+            **describe_material(ssr.description[pos], f"{i + 1}"),
+        ))
+    return materials
+
+
+def _buffered(materials: list, use_forms: bool) -> int:
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=PAGE_SIZE)
+    bill = MaterialsBill(p, use_forms=use_forms)
+    for m in materials:
+        bill.add_material(m)
+    bill.finish()
+    p.save()
+    return len(buffer.getvalue())
+
+
+def _streamed(materials: list, use_forms: bool) -> int:
+    return sum(len(chunk) for chunk in stream_materials_bill(materials, use_forms=use_forms))
+
+
+def _phases(materials: list, workers: int):
+    """(layout s, [range render s], join s) of a bill split for `workers`."""
+    t0 = time.perf_counter()
+    rows = [bill_pdf.bill_row(m) for m in materials]
+    starts = bill_pdf.page_starts(rows)
+    layout = time.perf_counter() - t0
+
+    ranges = bill_pdf._split_ranges(rows, starts, workers)
+    totals = [None] * (len(ranges) - 1) + [sum(r.amount for r in rows)]
+    parts, timings = [], []
+    for rng, total in zip(ranges, totals):
+        t0 = time.perf_counter()
+        parts.append(bill_pdf._record_range(rng, total))
+        timings.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    bill_pdf._join_ranges(parts)
+    return layout, timings, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    materials = _materials(args.rows)
+    print(f"{args.rows} rows")
+    print(f"{'mode':<16} {'mean s':>8} {'min s':>8} {'KB':>9}")
+    for name, render in (("buffered", _buffered), ("stream", _streamed)):
+        for use_forms in (False, True):
+            timings = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                size = render(materials, use_forms)
+                timings.append(time.perf_counter() - t0)
+            label = f"{name}+forms" if use_forms else name
+            print(
+                f"{label:<16} {statistics.mean(timings):>8.2f} {min(timings):>8.2f} "
+                f"{size / 1024:>9.0f}"
+            )
+
+    print()
+    print(
+        f"{'workers':<8} {'wall s':>7} {'layout s':>9} {'ranges s':>9} "
+        f"{'slowest s':>10} {'join s':>8} {'N cores s':>10} {'speedup':>8}"
+    )
+    serial = None
+    for workers in args.workers:
+        t0 = time.perf_counter()
+        bill_pdf.render_materials_bill(materials, workers=workers)
+        wall = time.perf_counter() - t0
+        layout, ranges, join = _phases(materials, workers)
+        on_cores = layout + max(ranges) + join
+        serial = serial or on_cores
+        print(
+            f"{workers:<8} {wall:>7.2f} {layout:>9.2f} {sum(ranges):>9.2f} "
+            f"{max(ranges):>10.2f} {join:>8.2f} {on_cores:>10.2f} {serial / on_cores:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Compare SSR fuzzy-match engines on accuracy and latency.
+
+Run from backend/:
+
+    python -m app.utils.bench_ssr_match [--limit 50] [--queries file.txt]
+                                        [--pruning both|on|off]
+
+Queries default to the BOQ.json descriptions (one per line when a file is
+given). The "full" engine (scan every rated row) without pruning is the
+reference the other runs are scored against.
+
+"ratio/q" is the number of full SequenceMatcher.ratio() computations per
+query and "pruned/q" the candidate rows the upper bounds (FUZZY_PRUNING)
+ruled out instead; with --pruning both every engine runs with and without
+pruning, so the saved ratio() calls can be read off directly.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+
+from . import ssr_loader
+from .catalog import catalogs
+
+ENGINES = ["full", "trigram", "tfidf"]
+
+
+def _load_queries(path: str | None, limit: int) -> list[str]:
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        with open(ssr_loader.BOQ_JSON, "r", encoding="utf-8") as f:
+            queries = [
+                row.get("Description of Work", "")
+                for row in json.load(f)
+                if row.get("Description of Work")
+            ]
+    return queries[:limit] if limit else queries
+
+
+def _run(engine: str, pruning: bool, queries: list[str]):
+    ssr_loader.MATCH_ENGINE = engine
+    ssr_loader.FUZZY_PRUNING = pruning
+    # start every run from an empty match result cache
+    ssr_loader._match_cache.invalidate(catalogs.current().version)
+    results, timings = [], []
+    # silence the "FUZZY MATCH USED" prints
+    with contextlib.redirect_stdout(io.StringIO()):
+        ssr_loader.fetch_ssr_rate("warm up", 1.0)
+        before = ssr_loader.get_match_stats()
+        for q in queries:
+            t0 = time.perf_counter()
+            info = ssr_loader.fetch_ssr_rate(q, 1.0)
+            timings.append((time.perf_counter() - t0) * 1000)
+            results.append(info["ssr_item_no"] if info else None)
+    after = ssr_loader.get_match_stats()
+    work = {k: after[k] - before[k] for k in ("ratio_scored", "ratio_pruned")}
+    return results, timings, work
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", help="text file, one description per line")
+    parser.add_argument("--limit", type=int, default=50, help="0 = all queries")
+    parser.add_argument("--engines", nargs="+", default=ENGINES, choices=ENGINES)
+    parser.add_argument("--pruning", default="both", choices=["both", "on", "off"])
+    args = parser.parse_args()
+
+    queries = _load_queries(args.queries, args.limit)
+    catalogs.current()
+    prunings = {"both": [False, True], "on": [True], "off": [False]}[args.pruning]
+
+    reference = None
+    print(f"{len(queries)} queries")
+    print(
+        f"{'engine':<14} {'mean ms':>9} {'p95 ms':>9} {'ratio/q':>8} "
+        f"{'pruned/q':>9} {'matched':>8} {'agree':>7}"
+    )
+    for engine in args.engines:
+        for pruning in prunings:
+            results, timings, work = _run(engine, pruning, queries)
+            if reference is None and engine == "full" and not pruning:
+                reference = results
+            p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+            agree = (
+                f"{sum(a == b for a, b in zip(results, reference)) / len(queries):.1%}"
+                if reference is not None else "-"
+            )
+            matched = sum(r is not None for r in results)
+            name = f"{engine}+prune" if pruning else engine
+            print(
+                f"{name:<14} {statistics.mean(timings):>9.2f} {p95:>9.2f} "
+                f"{work['ratio_scored'] / len(queries):>8.1f} "
+                f"{work['ratio_pruned'] / len(queries):>9.1f} "
+                f"{matched:>8} {agree:>7}"
+            )
+    ssr_loader.FUZZY_PRUNING = True
+
+
+if __name__ == "__main__":
+    main()
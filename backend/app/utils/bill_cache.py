@@ -0,0 +1,148 @@
+"""
+On-disk cache of the generated materials bill (PDF / Excel).
+
+A bill is stored under a key hashed from everything it is drawn from:
+the bill-relevant columns of every material, in order, plus the kind
+("pdf" / "xlsx") and BILL_TEMPLATE_VERSION. The same data always maps
+to the same file, so a repeat download is served from disk, and the key
+doubles as the response ETag (a matching If-None-Match gets a 304).
+
+Since the key changes with the data, a stale file is never served, even
+by a worker that didn't see the change. Files of old keys are left to
+prune(), which runs whenever a bill is stored: it keeps the MAX_FILES
+most recently used bills, and removes the others only once they have
+gone unused for GRACE_SECONDS, so a response still sending one (from
+this or another worker) is never cut short.
+
+    BILL_CACHE=0            disable
+    BILL_CACHE_DIR          where the files go (default backend/bill_cache)
+    BILL_CACHE_MAX_FILES    bills always kept (default 8)
+    BILL_CACHE_GRACE        seconds an older bill is kept after its last use (default 600)
+"""
+
+import hashlib
+import os
+import time
+
+ENABLED = os.getenv("BILL_CACHE", "1") == "1"
+CACHE_DIR = os.getenv(
+    "BILL_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "bill_cache"),
+)
+
+MAX_FILES = int(os.getenv("BILL_CACHE_MAX_FILES", 8))
+GRACE_SECONDS = int(os.getenv("BILL_CACHE_GRACE", 600))
+
+# Bump whenever the layout of the bill PDF or Excel changes
+BILL_TEMPLATE_VERSION = 2
+
+# material columns the bills are drawn from
+BILL_COLUMNS = (
+    "id", "description", "boq_item_no", "unit", "quantity", "base_rate", "total_amount",
+)
+
+
+def _new_hash(kind: str):
+    return hashlib.sha256(f"{kind}\x1e{BILL_TEMPLATE_VERSION}\x1e".encode("utf-8"))
+
+
+def _hash_row(h, row):
+    h.update("\x1f".join(
+        "" if v is None else repr(v) for v in (getattr(row, c) for c in BILL_COLUMNS)
+    ).encode("utf-8"))
+    h.update(b"\x1e")
+
+
+def bill_key(kind: str, rows) -> str:
+    """Content hash of the bill of `kind` over these material rows."""
+    h = _new_hash(kind)
+    for row in rows:
+        _hash_row(h, row)
+    return h.hexdigest()[:32]
+
+
+class KeyedRows:
+    """
+    Passes `rows` through once, hashing them as bill_key() does; `key` is
+    set when they are exhausted. Lets a bill rendered from a chunked
+    query be stored under the key of exactly the rows it was drawn from.
+    """
+
+    def __init__(self, kind: str, rows):
+        self._hash = _new_hash(kind)
+        self._rows = rows
+        self.key = None
+
+    def __iter__(self):
+        for row in self._rows:
+            _hash_row(self._hash, row)
+            yield row
+        self.key = self._hash.hexdigest()[:32]
+
+
+def path_for(key: str, kind: str) -> str:
+    return os.path.join(CACHE_DIR, f"materials_bill-{key}.{kind}")
+
+
+def lookup(key: str, kind: str):
+    """Path of the cached bill, or None. A hit counts as a use (see prune)."""
+    path = path_for(key, kind)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def store(key: str, kind: str, data: bytes) -> str:
+    """Write the bill; renamed into place once complete."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = path_for(key, kind)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    prune()
+    return path
+
+
+def get_or_render(key: str, kind: str, render) -> str:
+    """Path of the cached bill, rendered with render() and stored on a miss."""
+    return lookup(key, kind) or store(key, kind, render())
+
+
+def prune():
+    """
+    Remove cached bills beyond the MAX_FILES most recently used (stored
+    or looked up) that have gone unused for GRACE_SECONDS.
+    """
+    try:
+        names = os.listdir(CACHE_DIR)
+    except FileNotFoundError:
+        return
+    files = []
+    for name in names:
+        # leave .tmp files to the worker writing them
+        if name.startswith("materials_bill-") and not name.endswith(".tmp"):
+            path = os.path.join(CACHE_DIR, name)
+            try:
+                files.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                pass
+    files.sort(reverse=True)
+
+    cutoff = time.time() - GRACE_SECONDS
+    for mtime, path in files[MAX_FILES:]:
+        if mtime < cutoff:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def etag_matches(if_none_match: str | None, key: str) -> bool:
+    """Whether an If-None-Match header value matches the bill with `key`."""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == f'"{key}"' for t in tags)
@@ -0,0 +1,87 @@
+"""
+Materials bill as an Excel workbook: the same columns as the PDF
+(bill_pdf.py), one row per material and the totals below.
+
+The workbook is write-only: rows go to disk as they are appended, with
+their number formats set on the way, so `rows` can be a chunked query
+(bill_rows(db).yield_per(...)) and a bill of tens of thousands of rows
+stays small in memory.
+"""
+
+import io
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+from .bill_layout import layout_of
+
+NUMBER_FORMAT = "0.00"
+
+
+def render_materials_bill_xlsx(rows) -> bytes:
+    """The bill workbook for these materials (in order), as xlsx bytes."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Materials Bill")
+
+    def num(value):
+        # numeric columns (4, 6, 8, 9) below the header
+        cell = WriteOnlyCell(ws, value=value)
+        cell.number_format = NUMBER_FORMAT
+        return cell
+
+    # Header row (10 columns)
+    # 1–3 blank, 4=Qty, 5=Item No + Desc, 6=Rate, 7=Unit, 8=Amount, 9=Amount, 10 blank
+    ws.append([
+        "", "", "",              # 1,2,3 blank
+        "Quantity",              # 4
+        "Items of work (Item No + Description)",  # 5
+        "Rate",                  # 6
+        "Unit",                  # 7
+        "Amount (Col 8)",        # 8
+        "Amount (Col 9)",        # 9
+        ""                       # 10 blank
+    ])
+
+    grand_without_18 = 0.0
+
+    for m in rows:
+        qty = float(m.quantity or 0.0)
+        amount = float(m.total_amount or 0.0)
+        base_rate = float(m.base_rate or 0.0)
+        unit = m.unit or ""
+        # "Item No. X - description", stored with the material (bill_layout.py)
+        item_text = layout_of(m).item_text
+
+        grand_without_18 += amount
+
+        ws.append([
+            "", "", "",              # col1,2,3
+            num(qty),                # col4
+            item_text,               # col5
+            num(base_rate),          # col6
+            unit,                    # col7
+            num(amount),             # col8
+            num(amount),             # col9
+            ""                       # col10
+        ])
+
+    # Totals section at the bottom (similar to PDF)
+    gst_18 = round(grand_without_18 * 0.18, 2)
+    total_with_18 = round(grand_without_18 + gst_18, 2)
+
+    ws.append([])  # blank row
+    for label, value in (
+        ("A)", grand_without_18),
+        ("(-)", 0.0),
+        ("", grand_without_18),
+        ("18%", gst_18),
+        ("Total", total_with_18),
+        ("Price Escallation", 0.0),
+        ("Grand Total", total_with_18),
+    ):
+        ws.append(["", "", "", "", label, "", "", num(value), num(value), ""])
+
+    # Save to memory
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
@@ -0,0 +1,54 @@
+"""
+How a material's description is laid out on the bills.
+
+The cleanup and wrapping of long SSR descriptions is done once, when a
+material is created (crud.create_material), and stored on the Material
+row; the PDF (bill_pdf.py) and Excel (bill_excel.py) exporters only read
+it back. Rows stored by an older DESC_LAYOUT_VERSION (or before these
+columns existed) are laid out again on the fly, and rewritten by
+crud.backfill_material_layout() at startup.
+"""
+
+import re
+from textwrap import wrap
+from typing import NamedTuple
+
+# Bump whenever the output of describe_material changes
+DESC_LAYOUT_VERSION = 1
+
+LINE_H = 10
+DESC_WRAP = 90   # characters per description line in the PDF
+
+
+class DescLayout(NamedTuple):
+    desc_lines: list
+    row_height: float
+    item_text: str
+
+
+def describe_material(description: str, boq_item_no: str) -> dict:
+    """Layout columns of a material (keyword arguments of models.Material)."""
+    raw_desc = description or ""
+    clean_desc = re.sub(r"\s+", " ", raw_desc.replace("\n", " ").replace("\r", " ")).strip()
+    desc_lines = wrap(clean_desc, DESC_WRAP) or [""]
+
+    boq_no = (boq_item_no or "").strip()
+    item_label = f"Item No. {boq_no}" if boq_no else "Item"
+
+    return {
+        "clean_description": clean_desc,
+        # a wrapped line never contains a newline
+        "desc_lines": "\n".join(desc_lines),
+        # height = one top line + all desc lines + padding
+        "row_height": LINE_H * (1 + len(desc_lines)) + 10,
+        "item_text": f"{item_label} - {clean_desc}" if clean_desc else item_label,
+        "layout_version": DESC_LAYOUT_VERSION,
+    }
+
+
+def layout_of(m) -> DescLayout:
+    """The stored layout of a material, or a fresh one if it is missing or stale."""
+    if getattr(m, "layout_version", None) == DESC_LAYOUT_VERSION:
+        return DescLayout(m.desc_lines.split("\n"), m.row_height, m.item_text)
+    fields = describe_material(m.description, getattr(m, "boq_item_no", None))
+    return DescLayout(fields["desc_lines"].split("\n"), fields["row_height"], fields["item_text"])
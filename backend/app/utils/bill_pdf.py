@@ -0,0 +1,543 @@
+"""
+Running-account bill (Part I - Account of work executed) for the
+materials table, drawn with reportlab.
+
+MaterialsBill draws onto any canvas: /materials/bill/pdf uses a normal
+Canvas over a BytesIO, and with ?stream=true a StreamingCanvas
+(pdf_stream.py) so pages are sent while later materials are still
+being read.
+"""
+
+import io
+import os
+from typing import Iterable, NamedTuple
+
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfgen import canvas
+
+from . import process_pool
+from .bill_layout import LINE_H, layout_of
+from .pdf_stream import PageRecorder, PdfStreamWriter, StreamingCanvas
+
+PAGE_SIZE = landscape(A4)
+
+# Materials read from the DB per query when streaming; with one page of
+# output this bounds what a streamed bill keeps in memory.
+STREAM_CHUNK_ROWS = int(os.getenv("BILL_STREAM_CHUNK", 500))
+
+# Bills of at least PARALLEL_MIN_PAGES pages are split into PDF_WORKERS
+# page ranges, drawn in the shared process pool and joined
+# (render_materials_bill)
+PDF_WORKERS = int(os.getenv("BILL_PDF_WORKERS", process_pool.WORKERS))
+PARALLEL_MIN_PAGES = 40
+
+HEADER_FORM = "bill_header"
+ROW_GRID_FORM = "bill_row_grid"
+
+# a row that would end below this starts a new page
+BOTTOM_Y = 110
+# top of the first row on every page (below the header block)
+FIRST_ROW_Y = PAGE_SIZE[1] - 55 - 8 - 3 * LINE_H - 14
+
+
+class BillRow(NamedTuple):
+    """One material as drawn on the bill, description already wrapped."""
+    qty: float
+    amount: float
+    base_rate: float
+    unit: str
+    boq_no: str
+    desc_lines: list
+    row_height: float
+
+
+def bill_row(m) -> BillRow:
+    """Lay out one material (ORM object or bill_rows() row)."""
+    qty = float(m.quantity or 0.0)
+    amount = float(m.total_amount or 0.0)
+    base_rate = float(m.base_rate or 0.0)
+    unit = (m.unit or "").strip()
+    # use saved BOQ item no; fallback "-" if not present
+    boq_no = (getattr(m, "boq_item_no", "") or "").strip() or "-"
+
+    # description wrapped when the material was saved (bill_layout.py)
+    desc_lines, row_height, _ = layout_of(m)
+
+    return BillRow(qty, amount, base_rate, unit, boq_no, desc_lines, row_height)
+
+
+class MaterialsBill:
+    """
+    Draws the bill one material at a time: add_material() for each row in
+    order, then finish() for the totals and signature block.
+    """
+
+    def __init__(self, p, use_forms: bool = True):
+        self.p = p
+        self.width, self.height = PAGE_SIZE
+
+        self.margin_left = 30
+        self.margin_right = self.width - 30
+        self.table_width = self.margin_right - self.margin_left
+
+        # -------- COLUMN POSITIONS (11 vertical lines = 10 columns) ----------
+        self.col1_x  = self.margin_left
+        self.col2_x  = self.col1_x + 35   # 1
+        self.col3_x  = self.col2_x + 35   # 2
+        self.col4_x  = self.col3_x + 55   # 3
+        self.col5_x  = self.col4_x + 75   # 4 (Quantity)
+        self.col6_x  = self.col5_x + 210  # 5 (Items of work)
+        self.col7_x  = self.col6_x + 60   # 6 (Rate)
+        self.col8_x  = self.col7_x + 70   # 7 (Unit)
+        self.col9_x  = self.col8_x + 70   # 8 (Amt Up-to-date)
+        self.col10_x = self.col9_x + 60   # 9 (Amt Since previous bill)
+        self.last_x  = self.margin_right  # 10 (Remarks)
+        self.col_lines = [
+            self.col1_x, self.col2_x, self.col3_x, self.col4_x, self.col5_x,
+            self.col6_x, self.col7_x, self.col8_x, self.col9_x, self.col10_x, self.last_x,
+        ]
+
+        self.line_h = LINE_H
+        self.y = 0.0
+        self.grand_without_18 = 0.0
+
+        # header block: title, then 3 text rows between these lines
+        self.header_top = self.height - 55 - 8
+        self.header_bottom = self.header_top - (3 * self.line_h)
+
+        # the header and the row verticals are the same on every page /
+        # row: draw them once as form XObjects and only place them after
+        self.use_forms = use_forms
+        if use_forms:
+            p.beginForm(HEADER_FORM)
+            self._draw_header_frame()
+            p.endForm()
+            # verticals of a row 1pt high, scaled to each row's height
+            # (only y is scaled, so the line width stays as it is)
+            p.beginForm(ROW_GRID_FORM, 0, 0, self.width, 1)
+            for x in self.col_lines:
+                p.line(x, 0, x, 1)
+            p.endForm()
+
+        # -------- START FIRST PAGE --------
+        self.draw_header()
+
+    def ensure_space(self, h_needed: float):
+        """Start new page if not enough space for h_needed."""
+        if self.y - h_needed < BOTTOM_Y:
+            self.p.showPage()
+            self.draw_header()
+
+    def draw_header(self):
+        p = self.p
+        if self.use_forms:
+            p.doForm(HEADER_FORM)
+            # the form's line width doesn't carry over to the page
+            p.setLineWidth(0.5)
+        else:
+            self._draw_header_frame()
+
+        self.y = FIRST_ROW_Y
+        p.setFont("Helvetica", 8)
+
+    def _draw_header_frame(self):
+        """Title, header boxes and column headings (same on every page)."""
+        p, width, height, line_h = self.p, self.width, self.height, self.line_h
+        margin_left, margin_right = self.margin_left, self.margin_right
+        col1_x, col2_x, col3_x, col4_x = self.col1_x, self.col2_x, self.col3_x, self.col4_x
+        col5_x, col6_x, col7_x, col8_x = self.col5_x, self.col6_x, self.col7_x, self.col8_x
+        col9_x, col10_x, last_x = self.col9_x, self.col10_x, self.last_x
+
+        p.setFont("Helvetica-Bold", 11)
+        p.drawCentredString(width / 2, height - 55, "Part I - Account of work executed")
+
+        header_top = self.header_top
+        header_bottom = self.header_bottom
+        row2_y = header_top - line_h
+        row3_y = header_top - 2 * line_h
+
+        # outer rectangle
+        p.setLineWidth(0.5)
+        p.rect(margin_left, header_bottom, self.table_width, header_top - header_bottom)
+
+        # vertical lines
+        for x in self.col_lines:
+            p.line(x, header_bottom, x, header_top)
+
+        # horizontal lines to split 3 header rows
+        p.line(margin_left, row2_y, margin_right, row2_y)
+        p.line(margin_left, row3_y, margin_right, row3_y)
+
+        # ---------- HEADER TEXT ----------
+        p.setFont("Helvetica-Bold", 7)
+
+        # Row 1 – grouped headings
+        # cols 1–3 : Advance payments...
+        p.drawCentredString(
+            (col1_x + col4_x) / 2,
+            header_top - 3,
+            "Advance payments, for work"
+        )
+        p.drawCentredString(
+            (col1_x + col4_x) / 2,
+            header_top - 3 - line_h,
+            "done not yet measured"
+        )
+
+        # col 4 : Quantity executed…
+        p.drawCentredString(
+            (col4_x + col5_x) / 2,
+            header_top - 3,
+            "Quantity"
+        )
+        p.drawCentredString(
+            (col4_x + col5_x) / 2,
+            header_top - 3 - line_h,
+            "executed up-"
+        )
+        p.drawCentredString(
+            (col4_x + col5_x) / 2,
+            header_top - 3 - 2 * line_h,
+            "to date as per"
+        )
+        p.drawCentredString(
+            (col4_x + col5_x) / 2,
+            header_top - 3 - 3 * line_h,
+            "measurement book"
+        )
+
+        # col 5 : Items of work
+        p.drawCentredString(
+            (col5_x + col6_x) / 2,
+            header_top - 3,
+            "Items of work"
+        )
+        p.drawCentredString(
+            (col5_x + col6_x) / 2,
+            header_top - 3 - line_h,
+            "(Grouped Under Sub-heads or Sub-works of estimate)"
+        )
+
+        # col 6 : Rate
+        p.drawCentredString(
+            (col6_x + col7_x) / 2,
+            header_top - 3,
+            "Rate"
+        )
+        p.drawCentredString(
+            (col6_x + col7_x) / 2,
+            header_top - 3 - line_h,
+            "(Total fees payable)"
+        )
+
+        # col 7 : Unit
+        p.drawCentredString(
+            (col7_x + col8_x) / 2,
+            header_top - 3,
+            "Unit"
+        )
+
+        # cols 8–9 : Payment on the basis...
+        p.drawCentredString(
+            (col8_x + col10_x) / 2,
+            header_top - 3,
+            "Payment on the basis of actual"
+        )
+        p.drawCentredString(
+            (col8_x + col10_x) / 2,
+            header_top - 3 - line_h,
+            "measurements"
+        )
+
+        # col 10 : Remarks...
+        p.drawCentredString(
+            (col10_x + last_x) / 2,
+            header_top - 3,
+            "Remarks"
+        )
+        p.drawCentredString(
+            (col10_x + last_x) / 2,
+            header_top - 3 - line_h,
+            "(with reasons for delay in"
+        )
+        p.drawCentredString(
+            (col10_x + last_x) / 2,
+            header_top - 3 - 2 * line_h,
+            "adjusting payments shown"
+        )
+        p.drawCentredString(
+            (col10_x + last_x) / 2,
+            header_top - 3 - 3 * line_h,
+            "in column (1)"
+        )
+
+        # Row 2 – sub-headings for cols 1–3 and 8–9
+        p.setFont("Helvetica-Bold", 7)
+
+        # col1
+        p.drawCentredString(
+            (col1_x + col2_x) / 2,
+            row3_y + 3,
+            "Total as"
+        )
+        p.drawCentredString(
+            (col1_x + col2_x) / 2,
+            row3_y + 3 - line_h,
+            "per previous"
+        )
+        p.drawCentredString(
+            (col1_x + col2_x) / 2,
+            row3_y + 3 - 2 * line_h,
+            "bill"
+        )
+
+        # col2
+        p.drawCentredString(
+            (col2_x + col3_x) / 2,
+            row3_y + 3,
+            "Since"
+        )
+        p.drawCentredString(
+            (col2_x + col3_x) / 2,
+            row3_y + 3 - line_h,
+            "previous"
+        )
+        p.drawCentredString(
+            (col2_x + col3_x) / 2,
+            row3_y + 3 - 2 * line_h,
+            "bill"
+        )
+
+        # col3
+        p.drawCentredString(
+            (col3_x + col4_x) / 2,
+            row3_y + 3,
+            "Total up-"
+        )
+        p.drawCentredString(
+            (col3_x + col4_x) / 2,
+            row3_y + 3 - line_h,
+            "to date"
+        )
+
+        # col8 / 9
+        p.drawCentredString(
+            (col8_x + col9_x) / 2,
+            row3_y + 3,
+            "Up-to-date"
+        )
+        p.drawCentredString(
+            (col9_x + col10_x) / 2,
+            row3_y + 3,
+            "Since previous bill"
+        )
+
+        # Row 3 – column numbers 1..10
+        num_y = header_bottom + 2
+        for idx, (xl, xr) in enumerate(zip(self.col_lines, self.col_lines[1:]), start=1):
+            p.drawCentredString((xl + xr) / 2, num_y, str(idx))
+
+    def add_material(self, m):
+        self.add_row(bill_row(m))
+
+    def add_row(self, row: BillRow):
+        p, line_h = self.p, self.line_h
+        col5_x, col6_x, col7_x = self.col5_x, self.col6_x, self.col7_x
+        col8_x, col9_x = self.col8_x, self.col9_x
+        qty, amount, base_rate, unit, boq_no, desc_lines, row_height = row
+
+        self.ensure_space(row_height + 4)
+
+        top_y = self.y
+        bottom_y = self.y - row_height
+
+        # row rectangle & verticals
+        p.rect(self.margin_left, bottom_y, self.table_width, row_height)
+        if self.use_forms:
+            p.saveState()
+            p.transform(1, 0, 0, row_height, 0, bottom_y)
+            p.doForm(ROW_GRID_FORM)
+            p.restoreState()
+        else:
+            for x in self.col_lines:
+                p.line(x, bottom_y, x, top_y)
+
+        # text baseline a bit lower to avoid touching borders
+        text_y = top_y - 6
+
+        # column 4 → Quantity
+        p.drawRightString(col5_x - 3, text_y, f"{qty:.3f}")
+
+        # column 5 → "Item No. X" and description
+        p.setFont("Helvetica-Bold", 8)
+        p.drawString(col5_x + 2, text_y, f"Item No. {boq_no}")
+        p.setFont("Helvetica", 8)
+        desc_y = text_y - line_h
+        for line in desc_lines:
+            p.drawString(col5_x + 2, desc_y, line)
+            desc_y -= line_h
+
+        # column 6 → Rate
+        p.drawRightString(col6_x + 55, text_y, f"{base_rate:.2f}")
+        # column 7 → Unit
+        p.drawString(col7_x + 2, text_y, unit)
+        # columns 8 & 9 → Amount (same)
+        p.drawRightString(col8_x + 65, text_y, f"{amount:.2f}")
+        p.drawRightString(col9_x + 55, text_y, f"{amount:.2f}")
+        # column 10 → Remarks blank
+
+        self.grand_without_18 += amount
+        # small gap between rows
+        self.y = bottom_y - 4
+
+    def finish(self, grand_without_18: float = None):
+        """
+        Totals + signatures. grand_without_18 defaults to the sum of the
+        rows drawn here; a page range of a bigger bill passes the bill's.
+        """
+        p, line_h = self.p, self.line_h
+        if grand_without_18 is None:
+            grand_without_18 = self.grand_without_18
+
+        # ---------- TOTALS + 18% GST ----------
+        self.ensure_space(7 * line_h + 30)
+
+        gst_18 = round(grand_without_18 * 0.18, 2)
+        total_with_18 = round(grand_without_18 + gst_18, 2)
+
+        def total_row(label: str, val: float, bold: bool = False):
+            p.setFont("Helvetica-Bold" if bold else "Helvetica", 8)
+            p.drawString(self.col5_x + 2, self.y, label)
+            p.drawRightString(self.col8_x + 65, self.y, f"{val:.2f}")
+            p.drawRightString(self.col9_x + 55, self.y, f"{val:.2f}")
+            self.y -= line_h
+
+        total_row("A)", grand_without_18, bold=True)
+        total_row("(-)", 0.0)
+        total_row("", grand_without_18)
+        total_row("18% GST", gst_18)
+        total_row("Total", total_with_18, bold=True)
+        total_row("Price Escallation", 0.0)
+        total_row("Grand Total", total_with_18, bold=True)
+
+        # ---------- SIGNATURE BLOCK ----------
+        if self.y < 90:
+            p.showPage()
+            self.y = self.height - 100
+
+        p.setFont("Helvetica", 9)
+        p.drawString(self.margin_left, 70, "Deputy Engineer,")
+        p.drawString(self.margin_left, 58, "Bandra (P.W.) Project Sub Division No. 2")
+        p.drawString(self.margin_left, 46, "Bandra")
+
+        p.drawString(self.width - 260, 70, "Executive Engineer,")
+        p.drawString(self.width - 260, 58, "North Mumbai Division,")
+        p.drawString(self.width - 260, 46, "Andheri, Mumbai.")
+
+        p.showPage()
+
+
+def page_starts(rows: list) -> list:
+    """
+    Index of the row each page after the first starts with, following
+    the breaks MaterialsBill.ensure_space makes. Only breaks before a row
+    that fits on an empty page are listed: a page can be drawn from one
+    of them on without knowing the pages before it.
+    """
+    starts = []
+    y = FIRST_ROW_Y
+    for i, row in enumerate(rows):
+        needed = row.row_height + 4
+        if y - needed < BOTTOM_Y:
+            if i and FIRST_ROW_Y - needed >= BOTTOM_Y:
+                starts.append(i)
+            y = FIRST_ROW_Y
+        y -= needed
+    return starts
+
+
+def _draw_range(p, rows: list, grand_without_18: float = None):
+    """
+    The bill pages of these rows only; with grand_without_18 (the last
+    range) they end with the totals, otherwise with the last row's page.
+    """
+    bill = MaterialsBill(p)
+    for row in rows:
+        bill.add_row(row)
+    if grand_without_18 is None:
+        p.showPage()
+    else:
+        bill.finish(grand_without_18)
+    p.save()
+
+
+def _render_range(rows: list, grand_without_18: float = None) -> bytes:
+    buffer = io.BytesIO()
+    _draw_range(canvas.Canvas(buffer, pagesize=PAGE_SIZE), rows, grand_without_18)
+    return buffer.getvalue()
+
+
+def _record_range(rows: list, grand_without_18: float = None) -> PageRecorder:
+    recorder = PageRecorder()
+    _draw_range(StreamingCanvas(recorder, pagesize=PAGE_SIZE), rows, grand_without_18)
+    return recorder
+
+
+def _split_ranges(rows: list, starts: list, parts: int) -> list:
+    """Cut the rows into `parts` runs of about as many pages, at page starts."""
+    bounds = [0] + starts
+    parts = min(parts, len(bounds))
+    cuts = [bounds[len(bounds) * i // parts] for i in range(parts)] + [len(rows)]
+    return [rows[a:b] for a, b in zip(cuts, cuts[1:])]
+
+
+def _join_ranges(recorders: list) -> bytes:
+    writer = PdfStreamWriter()
+    for recorder in recorders:
+        writer.add_recorded(recorder)
+    writer.close({})
+    return writer.take()
+
+
+def render_materials_bill(materials: Iterable, workers: int = None) -> bytes:
+    """
+    The whole bill PDF for these materials (in order).
+
+    Long bills are laid out first (wrapping, page breaks), then split
+    into `workers` page ranges (default PDF_WORKERS) drawn in the shared
+    process pool (process_pool.py), each range starting on a fresh page
+    exactly where the bill breaks; the last one adds the totals of the
+    whole bill. The pages come out the same as drawn in one go.
+    """
+    workers = PDF_WORKERS if workers is None else workers
+    rows = [bill_row(m) for m in materials]
+    # same order of additions as MaterialsBill.add_row
+    grand_without_18 = 0.0
+    for row in rows:
+        grand_without_18 += row.amount
+
+    starts = page_starts(rows) if workers > 1 else []
+    if len(starts) + 1 < PARALLEL_MIN_PAGES:
+        return _render_range(rows, grand_without_18)
+
+    ranges = _split_ranges(rows, starts, workers)
+    totals = [None] * (len(ranges) - 1) + [grand_without_18]
+    return _join_ranges(process_pool.map(_record_range, ranges, totals))
+
+
+def stream_materials_bill(materials: Iterable, use_forms: bool = True):
+    """
+    Yield the bill PDF in pieces, one page at a time, while `materials`
+    is consumed. Only the current page is held in memory.
+    """
+    writer = PdfStreamWriter()
+    p = StreamingCanvas(writer, pagesize=PAGE_SIZE)
+    bill = MaterialsBill(p, use_forms=use_forms)
+    for m in materials:
+        bill.add_material(m)
+        data = writer.take()
+        if data:
+            yield data
+    bill.finish()
+    p.save()
+    yield writer.take()
@@ -1,9 +1,4 @@
-from pathlib import Path
-from functools import lru_cache
-import json
-
-BASE_DIR = Path(__file__).resolve().parent.parent
-BOQ_JSON_PATH = BASE_DIR / "sample_data" / "BOQ.json"
+from .catalog import catalogs
 
 
 def _normalize(text: str) -> str:
@@ -13,50 +8,18 @@ def _normalize(text: str) -> str:
     return " ".join(str(text).split()).strip().lower()
 
 
-@lru_cache(maxsize=1)
-def _load_boq_data():
-    """
-    Load BOQ.json once and cache it.
-    Expected: list of dict rows with keys like:
-      - "BOQ_Item_No." or "BOQ Item No"
-      - "Description of Work"
-    """
-    try:
-        with open(BOQ_JSON_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
-
-    if isinstance(data, list):
-        return data
-    if isinstance(data, dict):
-        rows = data.get("rows") or data.get("data") or []
-        if isinstance(rows, list):
-            return rows
-    return []
-
-
 def fetch_boq_item_no(description: str) -> str | None:
     """
     Given an item description, try to find a match in BOQ.json and return the BOQ item no.
     Match rule: normalized exact string match on "Description of Work".
+    When several rows share a description the first one wins.
     """
     target = _normalize(description)
     if not target:
         return None
 
-    for row in _load_boq_data():
-        desc = (
-            row.get("Description of Work")
-            or row.get("Description_of_Work")
-            or row.get("Description")
-            or ""
-        )
-        if _normalize(desc) == target:
-            return (
-                row.get("BOQ_Item_No.")
-                or row.get("BOQ Item No")
-                or row.get("BOQ_Item_No")
-            )
-
-    return None
+    catalog = catalogs.current()
+    positions = catalog.boq_index["by_desc"].get(target)
+    if not positions:
+        return None
+    return catalog.boq.item_no[positions[0]] or None
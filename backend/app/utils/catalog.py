@@ -0,0 +1,269 @@
+"""
+Versioned SSR/BOQ catalogues with hot reload.
+
+All lookups read the catalogue through `catalogs.current()`. A reload
+(admin endpoint or the mtime watcher) builds a complete new Catalog -
+rows and every index - in its own thread and then swaps one reference,
+so requests never wait on a reload and a lookup that already holds the
+old version finishes on it.
+
+Rows are kept column-wise (SsrTable / BoqTable) rather than as one dict
+per row; both ssr_loader and boq_loader read the same tables. With
+CATALOG_MMAP=1 the columns and indexes are views of one memory-mapped
+file shared by all workers (see catalog_mmap.py).
+"""
+
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from . import catalog_mmap, catalog_snapshot
+
+# Poll the source JSON mtimes every N seconds and reload on change (0 = off).
+# With several uvicorn workers this is how every worker picks up a new
+# edition; the admin reload endpoint only reaches the worker serving it.
+WATCH_INTERVAL = float(os.getenv("CATALOG_WATCH_INTERVAL", 0))
+
+
+def build_parts() -> dict:
+    """Parse + normalise + index the JSON catalogues."""
+    from . import ssr_loader
+
+    ssr = ssr_loader._read_ssr_json()
+    boq = ssr_loader._read_boq_json()
+    boq_index = ssr_loader._build_boq_index(boq)
+    return {
+        "ssr": ssr,
+        "ssr_index": ssr_loader._build_ssr_index(ssr),
+        "boq": boq,
+        "boq_index": boq_index,
+        "ssr_boq": ssr_loader._build_ssr_boq_map(ssr, boq, boq_index),
+    }
+
+
+class _ColumnTable:
+    @classmethod
+    def from_columns(cls, **columns):
+        """Table over ready-made columns (e.g. memory-mapped), used as given."""
+        table = cls.__new__(cls)
+        table.__dict__.update(columns)
+        return table
+
+
+class SsrTable(_ColumnTable):
+    """
+    SSR rows, column-wise: row i is ssr_item_no[i], description[i], ...
+
+    Text columns are plain lists, repeated values (units, item nos,
+    specifications) are interned so each distinct string is stored once,
+    and rates are one float64 array. `norm` / `norm_add_spec` are the
+    normalised description / additional specification.
+    """
+
+    def __init__(self, ssr_item_no, reference_no, description,
+                 additional_specification, unit, rate, norm, norm_add_spec):
+        self.ssr_item_no = [sys.intern(v) for v in ssr_item_no]
+        self.reference_no = [sys.intern(v) for v in reference_no]
+        self.description = description
+        self.additional_specification = [sys.intern(v) for v in additional_specification]
+        self.unit = [sys.intern(v) for v in unit]
+        self.rate = np.asarray(rate, dtype=np.float64)
+        self.norm = norm
+        self.norm_add_spec = [sys.intern(v) for v in norm_add_spec]
+
+    def __len__(self):
+        return len(self.ssr_item_no)
+
+    def row(self, pos: int) -> "SsrRow":
+        return SsrRow(self, pos)
+
+
+class SsrRow:
+    """One SSR row copied out of an SsrTable (e.g. a match result)."""
+
+    __slots__ = (
+        "pos", "ssr_item_no", "reference_no", "description",
+        "additional_specification", "unit", "rate", "norm", "norm_add_spec",
+    )
+
+    def __init__(self, table: SsrTable, pos: int):
+        self.pos = pos
+        self.ssr_item_no = table.ssr_item_no[pos]
+        self.reference_no = table.reference_no[pos]
+        self.description = table.description[pos]
+        self.additional_specification = table.additional_specification[pos]
+        self.unit = table.unit[pos]
+        self.rate = float(table.rate[pos])
+        self.norm = table.norm[pos]
+        self.norm_add_spec = table.norm_add_spec[pos]
+
+
+class BoqTable(_ColumnTable):
+    """
+    BOQ rows, column-wise like SsrTable. Quantities are a float64 array
+    (NaN where BOQ.json has none).
+    """
+
+    def __init__(self, item_no, description, quantity, ref_page,
+                 norm_desc, norm_ref_page):
+        self.item_no = [sys.intern(v) for v in item_no]
+        self.description = description
+        self.quantity = np.asarray(quantity, dtype=np.float64)
+        self.ref_page = [sys.intern(v) for v in ref_page]
+        self.norm_desc = norm_desc
+        self.norm_ref_page = [sys.intern(v) for v in norm_ref_page]
+
+    def __len__(self):
+        return len(self.item_no)
+
+
+class Catalog:
+    """
+    One consistent version of the SSR + BOQ catalogues and their lookup
+    indexes. Not modified after it is published.
+    """
+
+    def __init__(self, parts: dict, sources: dict, origin: str):
+        self.ssr = parts["ssr"]
+        self.ssr_index = parts["ssr_index"]
+        self.boq = parts["boq"]
+        self.boq_index = parts["boq_index"]
+        self.ssr_boq = parts["ssr_boq"]      # SSR row -> BOQ item no
+
+        self.sources = sources      # (mtime_ns, size) of the JSON it came from
+        self.origin = origin        # "snapshot" or "json"
+        self.version = 0            # set by CatalogManager on publish
+        self.loaded_at = None
+        self.load_seconds = None
+
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    def derived(self, key: str, build):
+        """
+        Structure computed from this version on first use and kept with it
+        (e.g. the TF-IDF matrix, which only one match engine needs).
+        """
+        with self._derived_lock:
+            if key not in self._derived:
+                self._derived[key] = build(self)
+            return self._derived[key]
+
+
+class CatalogManager:
+    """Holds the current Catalog and swaps in reloaded versions."""
+
+    def __init__(self):
+        self._catalog = None
+        self._reload_lock = threading.RLock()
+        self._listeners = []
+        self._watcher = None
+        self.watch_interval = 0
+        self.reloads = 0
+        self.last_error = None
+
+    def current(self) -> Catalog:
+        catalog = self._catalog
+        if catalog is None:
+            catalog = self.reload(if_changed=True)
+        return catalog
+
+    def add_listener(self, fn):
+        """
+        Call fn(catalog) after every swap (e.g. to drop caches), and right
+        away if a catalogue is already loaded.
+        """
+        with self._reload_lock:
+            self._listeners.append(fn)
+            if self._catalog is not None:
+                fn(self._catalog)
+
+    def reload(self, if_changed: bool = False) -> Catalog:
+        """
+        Build a new Catalog (from the shared mmap file with CATALOG_MMAP=1,
+        else from the snapshot when it matches the JSON on disk, else from
+        the JSON) and publish it. With if_changed, keep the current one if
+        the source files haven't changed.
+
+        On failure the current catalogue stays in place and the error is
+        re-raised.
+        """
+        with self._reload_lock:
+            old = self._catalog
+            sources = catalog_snapshot.source_stats()
+            if if_changed and old is not None and old.sources == sources:
+                return old
+
+            t0 = time.perf_counter()
+            try:
+                shared = catalog_mmap.load(sources) if catalog_mmap.ENABLED else None
+                snapshot = None if shared else catalog_snapshot.read_snapshot(sources)
+                if shared is not None:
+                    new = Catalog(shared, sources, "mmap")
+                elif snapshot is not None:
+                    new = Catalog(snapshot, sources, "snapshot")
+                else:
+                    new = Catalog(build_parts(), sources, "json")
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                raise
+
+            new.load_seconds = round(time.perf_counter() - t0, 4)
+            new.loaded_at = datetime.utcnow()
+            new.version = old.version + 1 if old is not None else 1
+
+            self._catalog = new
+            if old is not None:
+                self.reloads += 1
+            self.last_error = None
+            for fn in self._listeners:
+                fn(new)
+
+            print(
+                f"Catalog v{new.version} loaded from {new.origin} "
+                f"in {new.load_seconds:.3f}s"
+            )
+            return new
+
+    def start_watcher(self, interval: float = WATCH_INTERVAL):
+        """Reload in a daemon thread whenever the source JSON changes."""
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload(if_changed=True)
+                except Exception as e:
+                    print(f"Catalog reload failed, keeping the current version: {e}")
+
+        self.watch_interval = interval
+        self._watcher = threading.Thread(target=watch, name="catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stats(self) -> dict:
+        catalog = self._catalog
+        stats = {
+            "version": None,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "watch_interval": self.watch_interval,
+        }
+        if catalog is not None:
+            stats.update({
+                "version": catalog.version,
+                "origin": catalog.origin,
+                "loaded_at": catalog.loaded_at.isoformat() + "Z",
+                "load_seconds": catalog.load_seconds,
+                "ssr_records": len(catalog.ssr),
+                "boq_records": len(catalog.boq),
+            })
+        return stats
+
+
+catalogs = CatalogManager()
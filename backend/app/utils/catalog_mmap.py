@@ -0,0 +1,293 @@
+"""
+SSR/BOQ catalogue shared by all uvicorn workers through one memory-mapped
+file.
+
+With CATALOG_MMAP=1 a worker maps catalog.mmap read-only instead of
+unpickling its own copy of the snapshot. Rows, normalised strings and
+lookup indexes are flat arrays in that file, so the OS page cache holds
+them once however many workers there are, and attaching takes about a
+millisecond.
+
+Inside the file:
+
+- text columns are a UTF-8 blob + offsets (StringColumn, behaves like the
+  list it replaces)
+- the dict indexes are 64-bit key hashes, sorted, with their values and
+  keys (HashIndex, behaves like the dict for get / in / [] / items)
+- NumPy arrays (rates, postings, ...) are stored as they are
+
+by_desc_page is only needed to build the SSR->BOQ mapping and is left
+out. The TF-IDF matrix is still built per worker, on first use of that
+engine.
+
+Build it at deploy time (convert_ssr_to_json.py does this too). A worker
+that finds the file missing or older than the JSON rebuilds it; the new
+file is renamed into place, so other workers are never affected.
+
+    python -m app.utils.catalog_mmap
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import time
+
+import numpy as np
+
+from . import catalog_snapshot
+
+ENABLED = os.getenv("CATALOG_MMAP", "0") == "1"
+MMAP_PATH = os.getenv(
+    "CATALOG_MMAP_PATH", os.path.join(catalog_snapshot.DATA_DIR, "catalog.mmap")
+)
+
+MAGIC = b"SSRCAT01"
+# Bump whenever the arrays written by build_mmap change
+MMAP_VERSION = 1
+
+# Where each catalogue part goes: text columns, dict indexes (True = the
+# values are lists of positions), and the rest are NumPy arrays.
+SSR_TEXT = (
+    "ssr_item_no", "reference_no", "description", "additional_specification",
+    "unit", "norm", "norm_add_spec",
+)
+BOQ_TEXT = ("item_no", "description", "ref_page", "norm_desc", "norm_ref_page")
+SSR_INDEXES = {"by_norm": True, "by_canon": True, "gram_ids": False}
+SSR_INDEX_ARRAYS = (
+    "postings", "postings_ptr", "trigram_counts", "word_postings", "word_ptr",
+)
+
+
+def _key_hash(key: str) -> int:
+    # stable across processes, unlike hash()
+    return int.from_bytes(
+        hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+class StringColumn:
+    """Read-only list of str stored as one UTF-8 blob + offsets."""
+
+    def __init__(self, blob: memoryview, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], "utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class HashIndex:
+    """
+    Read-only str -> position(s) mapping: entries sorted by key hash, the
+    key itself kept to rule out collisions. With multi, get() returns
+    the list of positions like the dict-of-lists it replaces.
+    """
+
+    def __init__(self, hashes: np.ndarray, values: np.ndarray,
+                 keys: StringColumn, multi: bool):
+        self._hashes = hashes
+        self._values = values
+        self._keys = keys
+        self._multi = multi
+
+    def get(self, key: str, default=None):
+        h = _key_hash(key)
+        hashes = self._hashes
+        i = int(hashes.searchsorted(np.uint64(h)))
+        found = []
+        while i < len(hashes) and hashes[i] == h:
+            if self._keys[i] == key:
+                found.append(int(self._values[i]))
+            i += 1
+        if not found:
+            return default
+        return found if self._multi else found[0]
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __getitem__(self, key: str):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def items(self):
+        """(key, value) pairs; equal keys are adjacent since they share a hash."""
+        key, values = None, []
+        for i in range(len(self._keys)):
+            k = self._keys[i]
+            if values and k != key:
+                yield key, values if self._multi else values[0]
+                values = []
+            key = k
+            values.append(int(self._values[i]))
+        if values:
+            yield key, values if self._multi else values[0]
+
+
+# ---------- writing ----------
+
+def _strings(name: str, values, arrays: dict):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    arrays[f"{name}.blob"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    arrays[f"{name}.offsets"] = offsets
+
+
+def _index(name: str, mapping: dict, multi: bool, arrays: dict):
+    entries = [
+        (_key_hash(key), key, value)
+        for key, values in mapping.items()
+        for value in (values if multi else [values])
+    ]
+    entries.sort(key=lambda e: e[0])   # stable: a key's positions stay in order
+    arrays[f"{name}.hashes"] = np.array([e[0] for e in entries], dtype=np.uint64)
+    arrays[f"{name}.values"] = np.array([e[2] for e in entries], dtype=np.int64)
+    _strings(f"{name}.keys", [e[1] for e in entries], arrays)
+
+
+def build_mmap(path: str = MMAP_PATH, parts: dict = None) -> str:
+    """
+    Write the catalogue (from `parts`, else the snapshot / JSON) as one
+    flat file; renamed into place once complete.
+    """
+    sources = catalog_snapshot.source_stats()
+    if parts is None:
+        from .catalog import build_parts
+        parts = catalog_snapshot.read_snapshot(sources) or build_parts()
+
+    ssr, boq = parts["ssr"], parts["boq"]
+    arrays = {}
+    for name in SSR_TEXT:
+        _strings(f"ssr.{name}", getattr(ssr, name), arrays)
+    arrays["ssr.rate"] = ssr.rate
+    for name in BOQ_TEXT:
+        _strings(f"boq.{name}", getattr(boq, name), arrays)
+    arrays["boq.quantity"] = boq.quantity
+
+    for name, multi in SSR_INDEXES.items():
+        _index(f"ssr_index.{name}", parts["ssr_index"][name], multi, arrays)
+    for name in SSR_INDEX_ARRAYS:
+        arrays[f"ssr_index.{name}"] = parts["ssr_index"][name]
+    _strings("ssr_index.words", parts["ssr_index"]["words"], arrays)
+    _index("boq_index.by_desc", parts["boq_index"]["by_desc"], True, arrays)
+    _strings("ssr_boq.item_no", parts["ssr_boq"]["item_no"], arrays)
+    _strings("ssr_boq.rule", parts["ssr_boq"]["rule"], arrays)
+
+    # header, then every array 8-byte aligned
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = [array.dtype.str, offset, int(array.size)]
+        offset += (array.nbytes + 7) & ~7
+    header = json.dumps({
+        "version": MMAP_VERSION,
+        "sources": sources,
+        "arrays": layout,
+    }).encode("utf-8")
+    data_start = (len(MAGIC) + 8 + len(header) + 7) & ~7
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][1])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    return path
+
+
+# ---------- attaching ----------
+
+def attach(sources: dict, path: str = MMAP_PATH):
+    """
+    Catalogue parts backed by the mapped file, or None if it is missing,
+    has another layout version or was built from other source files.
+    """
+    from .catalog import BoqTable, SsrTable
+
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if mm[:len(MAGIC)] != MAGIC:
+        print(f"Ignoring catalog file {path}: not a catalogue mmap")
+        return None
+    header_len = int.from_bytes(mm[len(MAGIC):len(MAGIC) + 8], "little")
+    header = json.loads(mm[len(MAGIC) + 8:len(MAGIC) + 8 + header_len])
+    data_start = (len(MAGIC) + 8 + header_len + 7) & ~7
+
+    built_from = {k: tuple(v) if v else None for k, v in header["sources"].items()}
+    if header["version"] != MMAP_VERSION or built_from != sources:
+        return None
+
+    buf = memoryview(mm)
+
+    def array(name):
+        dtype, offset, count = header["arrays"][name]
+        return np.frombuffer(mm, dtype=dtype, count=count, offset=data_start + offset)
+
+    def strings(name):
+        _, offset, count = header["arrays"][f"{name}.blob"]
+        start = data_start + offset
+        return StringColumn(buf[start:start + count], array(f"{name}.offsets"))
+
+    def index(name, multi):
+        return HashIndex(
+            array(f"{name}.hashes"), array(f"{name}.values"), strings(f"{name}.keys"), multi
+        )
+
+    ssr = SsrTable.from_columns(
+        rate=array("ssr.rate"), **{name: strings(f"ssr.{name}") for name in SSR_TEXT}
+    )
+    boq = BoqTable.from_columns(
+        quantity=array("boq.quantity"), **{name: strings(f"boq.{name}") for name in BOQ_TEXT}
+    )
+    ssr_index = {name: index(f"ssr_index.{name}", multi) for name, multi in SSR_INDEXES.items()}
+    ssr_index.update({name: array(f"ssr_index.{name}") for name in SSR_INDEX_ARRAYS})
+    ssr_index["words"] = strings("ssr_index.words")
+
+    return {
+        "ssr": ssr,
+        "ssr_index": ssr_index,
+        "boq": boq,
+        "boq_index": {"by_desc": index("boq_index.by_desc", True)},
+        "ssr_boq": {
+            "item_no": strings("ssr_boq.item_no"),
+            "rule": strings("ssr_boq.rule"),
+        },
+    }
+
+
+def load(sources: dict):
+    """attach(), rebuilding the file first if it is missing or stale."""
+    parts = attach(sources)
+    if parts is None:
+        print("Catalog mmap missing or stale, rebuilding it.")
+        build_mmap()
+        parts = attach(sources)
+    return parts
+
+
+if __name__ == "__main__":
+    t0 = time.perf_counter()
+    out = build_mmap()
+    print(f"Catalog mmap saved: {out} ({time.perf_counter() - t0:.2f}s)")
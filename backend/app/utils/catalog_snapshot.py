@@ -0,0 +1,90 @@
+"""
+Precompiled SSR/BOQ catalogue snapshot.
+
+Parsing ssr_data.json / BOQ.json and normalising + indexing every
+description costs every worker a few hundred milliseconds on its first
+lookup. The snapshot is one pickle holding the already built rows and
+lookup indexes of ssr_loader and boq_loader; the catalog manager
+(utils/catalog.py) uses it whenever it was built from the JSON files
+currently on disk.
+
+Rebuild after changing the JSON (convert_ssr_to_json.py does this too):
+
+    python -m app.utils.catalog_snapshot
+"""
+
+import os
+import pickle
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "sample_data")
+
+SSR_JSON = os.path.join(DATA_DIR, "ssr_data.json")
+BOQ_JSON = os.path.join(DATA_DIR, "BOQ.json")
+SNAPSHOT_PATH = os.getenv(
+    "CATALOG_SNAPSHOT", os.path.join(DATA_DIR, "catalog_snapshot.pickle")
+)
+
+# Bump whenever the layout of the pickled rows / indexes changes
+SNAPSHOT_VERSION = 4
+
+
+def source_stats() -> dict:
+    """(mtime_ns, size) of each source JSON, None if the file is missing."""
+    stats = {}
+    for name, path in (("ssr", SSR_JSON), ("boq", BOQ_JSON)):
+        try:
+            st = os.stat(path)
+            stats[name] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stats[name] = None
+    return stats
+
+
+def read_snapshot(sources: dict):
+    """
+    The snapshot dict if it exists, has the current layout version and was
+    built from JSON files with these source_stats(); otherwise None (the
+    catalogue is then built from the JSON).
+    """
+    try:
+        with open(SNAPSHOT_PATH, "rb") as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+        print(f"Ignoring unreadable catalog snapshot {SNAPSHOT_PATH}: {e}")
+        return None
+
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+    if snapshot.get("sources") != sources:
+        print("Catalog snapshot is older than the JSON sources, ignoring it.")
+        return None
+
+    return snapshot
+
+
+def build_snapshot(path: str = SNAPSHOT_PATH) -> str:
+    """Parse + index the JSON catalogues and write them as a snapshot."""
+    from .catalog import build_parts
+
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "sources": source_stats(),
+        **build_parts(),
+    }
+
+    # write + rename so running workers never read a half-written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return path
+
+
+if __name__ == "__main__":
+    t0 = time.perf_counter()
+    out = build_snapshot()
+    print(f"Catalog snapshot saved: {out} ({time.perf_counter() - t0:.2f}s)")
@@ -1,6 +1,7 @@
 import pandas as pd
 import json
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "sample_data")
@@ -32,3 +33,13 @@ with open(OUT_FILE, "w", encoding="utf-8") as f:
     json.dump(records, f, indent=2, ensure_ascii=False)
 
 print(f"JSON saved: {OUT_FILE}")
+
+# Rebuild the precompiled catalogue snapshot and the shared mmap file from
+# the new JSON, so workers keep their fast cold start (see
+# utils/catalog_snapshot.py and utils/catalog_mmap.py)
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+from app.utils.catalog_mmap import build_mmap
+from app.utils.catalog_snapshot import build_snapshot
+
+print(f"Catalog snapshot saved: {build_snapshot()}")
+print(f"Catalog mmap saved: {build_mmap()}")
@@ -0,0 +1,241 @@
+"""
+Invoice PDFs for many invoices in one request (month-end exports).
+
+    POST /invoices/batch/pdf {"invoice_ids": [1, 2, ...]}
+    POST /invoices/batch/pdf {"date_from": "...", "date_to": "...", "format": "pdf"}
+
+InvoicePDFGenerator renders the invoices in the shared process pool
+(process_pool.py), INVOICE_PDF_WORKERS at a time, and the response is
+streamed as they finish:
+format "zip" gives one PDF per invoice in finishing order, followed by
+timings.csv (render time, size and status of every invoice); "pdf" gives
+one PDF with all invoices in id order, joined page by page with
+PdfStreamWriter.add_recorded() (no merge pass).
+
+Memory stays bounded: invoices are read from the DB CHUNK_INVOICES at a
+time and at most 2 * workers of them are rendered or waiting to be
+written at once. An invoice that fails to render is skipped (and listed
+as failed in timings.csv) instead of breaking the archive.
+
+Large batches can also run as a background render job
+(kind "invoice_batch_zip" / "invoice_batch_pdf", see render_jobs.py).
+"""
+
+import csv
+import io
+import os
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from .. import crud
+from . import process_pool
+from .pdf_generator import InvoicePDFGenerator
+from .pdf_stream import PdfStreamWriter
+
+WORKERS = int(os.getenv("INVOICE_PDF_WORKERS", process_pool.WORKERS))
+CHUNK_INVOICES = 100
+GST_PERCENTAGE = 18
+
+FORMATS = {
+    # format -> (download filename, media type)
+    "zip": ("invoices.zip", "application/zip"),
+    "pdf": ("invoices.pdf", "application/pdf"),
+}
+
+# per-process generator, built on first use (also in each pool worker)
+_generator = None
+
+_stats_lock = threading.Lock()
+_stats = {"batches": 0, "invoices": 0, "failed": 0, "render_seconds": 0.0, "last_batch": []}
+
+
+def check_request(req):
+    """Raise ValueError for an export request that can't be run."""
+    if req.format not in FORMATS:
+        raise ValueError(f"Unknown format {req.format!r}, expected one of {sorted(FORMATS)}")
+    if req.invoice_ids is None and req.date_from is None and req.date_to is None:
+        raise ValueError("Give invoice_ids and/or a date_from / date_to range")
+
+
+def invoice_number(invoice) -> str:
+    return f"INV-{invoice.id:05d}"
+
+
+def invoice_data(invoice) -> dict:
+    """An Invoice row (with items and materials loaded) as InvoicePDFGenerator input."""
+    items = [
+        {
+            "description": item.material.description if item.material else "",
+            "quantity": item.quantity or 0.0,
+            "unit": (item.material.unit if item.material else None) or "",
+            "rate": item.rate or 0.0,
+            "amount": item.amount or 0.0,
+        }
+        for item in invoice.items
+    ]
+    subtotal = sum(item["amount"] for item in items)
+    gst_amount = round(subtotal * GST_PERCENTAGE / 100, 2)
+    return {
+        "invoice_number": invoice_number(invoice),
+        "client_name": invoice.client_name,
+        "client_address": invoice.site_name or "",
+        "date": invoice.created_at,
+        "items": items,
+        "subtotal": subtotal,
+        "gst_percentage": GST_PERCENTAGE,
+        "gst_amount": gst_amount,
+        "grand_total": subtotal + gst_amount,
+    }
+
+
+def _render(number: str, data: dict, template_type: str, merged: bool):
+    """(number, PDF bytes or PageRecorder or None, seconds, error) of one invoice."""
+    global _generator
+    if _generator is None:
+        _generator = InvoicePDFGenerator()
+    t0 = time.perf_counter()
+    try:
+        if merged:
+            result = _generator.record(data, template_type)
+        else:
+            result = _generator.render(data, template_type)
+        error = None
+    except Exception as e:
+        result, error = None, f"{type(e).__name__}: {e}"
+    return number, result, time.perf_counter() - t0, error
+
+
+def _rendered(invoices, template_type: str, merged: bool, workers: int):
+    """
+    _render() results of (number, data) pairs; in order when merged,
+    otherwise as they finish. At most 2 * workers are in flight.
+    """
+    if workers <= 1:
+        for number, data in invoices:
+            yield _render(number, data, template_type, merged)
+        return
+
+    pending = deque()
+
+    def take():
+        if merged:
+            return [pending.popleft().result()]
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+        return [future.result() for future in done]
+
+    try:
+        for number, data in invoices:
+            pending.append(process_pool.submit(_render, number, data, template_type, merged))
+            if len(pending) >= 2 * workers:
+                yield from take()
+        while pending:
+            yield from take()
+    finally:
+        # the client may have gone away mid-batch
+        for future in pending:
+            future.cancel()
+
+
+class _Sink:
+    """Unseekable file for ZipFile; take() drains what was written so far."""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def write(self, data) -> int:
+        self._buf += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+def stream_batch(db, req, workers: int = None):
+    """
+    Yield the export (ZIP or merged PDF, see FORMATS) of the invoices
+    `req` (schemas.InvoiceBatchExport) selects, in pieces as invoices
+    finish. Reads through `db`; give it a session of its own.
+    """
+    workers = WORKERS if workers is None else workers
+    merged = req.format == "pdf"
+    query = crud.invoices_for_export(db, req.invoice_ids, req.date_from, req.date_to)
+    invoices = (
+        (invoice_number(invoice), invoice_data(invoice))
+        for invoice in crud.iter_invoices(db, query, CHUNK_INVOICES)
+    )
+
+    timings = []
+    t0 = time.perf_counter()
+    if merged:
+        writer = PdfStreamWriter()
+        for number, recorder, seconds, error in _rendered(invoices, req.template_type, True, workers):
+            if recorder is not None:
+                writer.add_recorded(recorder)
+            timings.append((number, seconds, None, error))
+            data = writer.take()
+            if data:
+                yield data
+        writer.close({})
+        yield writer.take()
+    else:
+        sink = _Sink()
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for number, pdf, seconds, error in _rendered(invoices, req.template_type, False, workers):
+                if pdf is not None:
+                    archive.writestr(f"invoice_{number}.pdf", pdf)
+                timings.append((number, seconds, len(pdf) if pdf is not None else None, error))
+                data = sink.take()
+                if data:
+                    yield data
+            archive.writestr("timings.csv", _timings_csv(timings))
+        yield sink.take()
+
+    _record(timings, time.perf_counter() - t0)
+
+
+def _timings_csv(timings) -> str:
+    out = io.StringIO()
+    w = csv.writer(out)
+    w.writerow(["invoice_no", "file", "render_ms", "size_bytes", "status"])
+    for number, seconds, size, error in timings:
+        w.writerow([
+            number,
+            "" if error else f"invoice_{number}.pdf",
+            f"{seconds * 1000:.1f}",
+            "" if size is None else size,
+            error or "ok",
+        ])
+    return out.getvalue()
+
+
+def _record(timings, wall: float):
+    failed = sum(1 for *_, error in timings if error)
+    render_seconds = sum(seconds for _, seconds, _, _ in timings)
+    with _stats_lock:
+        _stats["batches"] += 1
+        _stats["invoices"] += len(timings)
+        _stats["failed"] += failed
+        _stats["render_seconds"] += render_seconds
+        _stats["last_batch"] = [
+            {"invoice_no": number, "render_ms": round(seconds * 1000, 1), "error": error}
+            for number, seconds, _, error in timings
+        ]
+    print(
+        f"Invoice batch: {len(timings)} invoices ({failed} failed) in {wall:.2f}s, "
+        f"{render_seconds:.2f}s rendering"
+    )
+
+
+def get_batch_stats() -> dict:
+    with _stats_lock:
+        return {**_stats, "workers": WORKERS, "last_batch": list(_stats["last_batch"])}
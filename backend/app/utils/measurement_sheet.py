@@ -0,0 +1,264 @@
+"""
+Item measurement sheets: Sr., Pile Description, No, B, D, L, Unit,
+Quantity rows of one SSR / BOQ item and their total.
+
+/materials/single-bill/pdf and /excel export one item; the measurement
+book endpoints (/materials/measurement-book/pdf and /excel) export many
+in one go - a PDF with one section per item, or a workbook with one
+sheet per item - looking the SSR and BOQ item nos of all of them up
+together (match_ssr_batch).
+"""
+
+import re
+from textwrap import wrap
+from typing import NamedTuple
+
+from reportlab.lib.pagesizes import A4
+
+from .. import schemas
+from .boq_loader import fetch_boq_item_no
+from .ssr_loader import fetch_ssr_rate, match_ssr_batch, rate_payload
+
+PAGE_SIZE = A4
+LINE_HEIGHT = 12
+
+EXCEL_HEADERS = ["Sr. No.", "Pile Description", "No", "Length", "Breadth", "Depth", "Quantity"]
+
+
+class SheetLookup(NamedTuple):
+    """SSR / BOQ details printed at the top of a sheet."""
+    ssr_item_no: str
+    unit: str
+    non_ssr: bool
+    boq_item_no: str
+
+
+def item_entries(req) -> list:
+    """
+    The measurement rows of a MaterialSingleBillRequest: its entries, or
+    one row made of the flat fields. Empty if it has neither.
+    """
+    entries = []
+    if getattr(req, "entries", None):
+        entries = list(req.entries)
+
+    if not entries and any(
+        v is not None
+        for v in [req.no_of_items, req.length, req.breadth, req.depth, req.quantity]
+    ):
+        entries.append(
+            schemas.MaterialMeasurementEntry(
+                pile_description=None,
+                no_of_items=req.no_of_items,
+                length=req.length,
+                breadth=req.breadth,
+                depth=req.depth,
+                quantity=req.quantity,
+            )
+        )
+    return entries
+
+
+def pdf_rows(entries) -> tuple:
+    """(rows, total quantity); a row's quantity defaults to No × L × B × D."""
+    total_qty = 0.0
+    normalized_entries = []
+    for e in entries:
+        no_val = e.no_of_items or 0
+        b_val = e.breadth or 0
+        d_val = e.depth or 0
+        l_val = e.length or 0
+
+        q_val = e.quantity
+        if q_val is None:
+            q_val = (no_val or 0) * (l_val or 0) * (b_val or 0) * (d_val or 0)
+
+        total_qty += q_val
+
+        normalized_entries.append(
+            {
+                "pile_description": e.pile_description or "",
+                "no": no_val,
+                "b": b_val,
+                "d": d_val,
+                "l": l_val,
+                "q": q_val,
+            }
+        )
+    return normalized_entries, total_qty
+
+
+def excel_rows(entries) -> list:
+    """Rows of the Excel sheet; quantity is always recomputed as No × L × B × D."""
+    rows = []
+    for idx, e in enumerate(entries, start=1):
+        no_ = float(e.no_of_items or 0)
+        L = float(e.length or 0)
+        B = float(e.breadth or 0)
+        D = float(e.depth or 0)
+        qty = no_ * L * B * D
+        rows.append(
+            {
+                "sr": idx,
+                "pile_description": e.pile_description or "",
+                "no_of_items": no_,
+                "length": L,
+                "breadth": B,
+                "depth": D,
+                "quantity": qty,
+            }
+        )
+    return rows
+
+
+def _sheet_lookup(ssr_info, boq_item_no) -> SheetLookup:
+    if ssr_info is None:
+        return SheetLookup("", "", True, boq_item_no or "")
+    return SheetLookup(
+        ssr_info.get("ssr_item_no", "") or "",
+        ssr_info.get("unit", "") or "",
+        False,
+        boq_item_no or "",
+    )
+
+
+def lookup_sheet(description: str, total_qty: float) -> SheetLookup:
+    """SSR / BOQ details of one item; no SSR lookup for a zero quantity (NON SSR)."""
+    ssr_info = fetch_ssr_rate(description, total_qty) if total_qty > 0 else None
+    return _sheet_lookup(ssr_info, fetch_boq_item_no(description))
+
+
+def lookup_sheets(items) -> list:
+    """lookup_sheet for many (description, total quantity) pairs, in one batch."""
+    wanted = [description for description, total_qty in items if total_qty > 0]
+    matches = dict(zip(wanted, match_ssr_batch(wanted)))
+    boq_nos = {
+        description: fetch_boq_item_no(description)
+        for description in dict.fromkeys(description for description, _ in items)
+    }
+
+    lookups = []
+    for description, total_qty in items:
+        match = matches.get(description) if total_qty > 0 else None
+        ssr_info = rate_payload(*match, total_qty) if match is not None else None
+        lookups.append(_sheet_lookup(ssr_info, boq_nos[description]))
+    return lookups
+
+
+def _draw_table_header(p, y):
+    p.setFont("Helvetica-Bold", 9)
+    p.drawString(40,  y, "Sr.")
+    p.drawString(60,  y, "Pile Description")
+    p.drawString(240, y, "No")
+    p.drawString(285, y, "B")
+    p.drawString(325, y, "D")
+    p.drawString(365, y, "L")
+    p.drawString(405, y, "Unit")
+    p.drawString(460, y, "Quantity")
+    y -= 12
+    p.line(40, y, 560, y)
+    return y - 8
+
+
+def draw_measurement_sheet(p, description: str, rows: list, total_qty: float,
+                           lookup: SheetLookup):
+    """
+    Draw one item's sheet from the top of a fresh page; it ends with
+    showPage(), so the next sheet starts on a page of its own.
+    """
+    width, height = PAGE_SIZE
+    non_ssr = lookup.non_ssr
+
+    y = height - 40
+    p.setFont("Helvetica-Bold", 11)
+    p.drawString(40, y, "Item Measurement Sheet")
+    y -= 18
+
+    # Item description
+    p.setFont("Helvetica", 9)
+    header_text = f"Item Description (from SSR / BOQ): {description}"
+    header_lines = wrap(header_text, 110)
+    for line in header_lines:
+        p.drawString(40, y, line)
+        y -= 12
+
+    y -= 4
+    p.setFont("Helvetica-Bold", 9)
+    if non_ssr:
+        p.drawString(40, y, "SSR Item No: NON SSR ITEM")
+    else:
+        p.drawString(40, y, f"SSR Item No: {lookup.ssr_item_no or '-'}")
+    y -= 12
+    p.drawString(40, y, f"BOQ Item No: {lookup.boq_item_no or '-'}")
+    y -= 16
+
+    # Table header
+    y = _draw_table_header(p, y)
+
+    p.setFont("Helvetica", 8)
+
+    for idx, row in enumerate(rows, start=1):
+        if y - LINE_HEIGHT < 60:
+            p.showPage()
+            y = _draw_table_header(p, height - 80)
+            p.setFont("Helvetica", 8)
+
+        pile_desc = row["pile_description"].replace("\n", " ").strip()
+        if len(pile_desc) > 35:
+            pile_desc = pile_desc[:35] + "..."
+
+        p.drawString(40, y, str(idx))
+        p.drawString(60, y, pile_desc)
+        p.drawRightString(270, y, f"{row['no']:.3f}")
+        p.drawRightString(310, y, f"{row['b']:.3f}")
+        p.drawRightString(350, y, f"{row['d']:.3f}")
+        p.drawRightString(390, y, f"{row['l']:.3f}")
+
+        p.drawString(405, y, lookup.unit if not non_ssr else "")
+
+        p.drawRightString(540, y, f"{row['q']:.3f}")
+
+        y -= LINE_HEIGHT
+
+    # Total
+    if y < 60:
+        p.showPage()
+        y = height - 80
+
+    p.setFont("Helvetica-Bold", 9)
+    p.line(380, y, 560, y)
+    y -= 12
+    p.drawRightString(500, y, "Total Quantity:")
+    p.drawRightString(560, y, f"{total_qty:.3f}")
+
+    p.showPage()
+
+
+def write_measurement_sheet(ws, description: str, rows: list):
+    """
+    Fill a write-only worksheet with one item's sheet: description in
+    row 1, table header in row 3, the rows below.
+    """
+    # Autosize a bit (simple version); widths go before the first row
+    for col in range(1, 8):
+        ws.column_dimensions[chr(64 + col)].width = 18
+
+    ws.append(["Item Description:", description])
+    ws.append([])
+    ws.append(EXCEL_HEADERS)
+    for r in rows:
+        ws.append([
+            r["sr"],
+            r["pile_description"],
+            r["no_of_items"],
+            r["length"],
+            r["breadth"],
+            r["depth"],
+            r["quantity"],
+        ])
+
+
+def sheet_title(index: int, description: str) -> str:
+    """Worksheet name for the index-th item: "3 Excavation in ..." (Excel allows 31 chars)."""
+    text = re.sub(r"[\[\]:*?/\\]", " ", " ".join((description or "").split()))
+    return f"{index} {text}"[:31].strip() or str(index)
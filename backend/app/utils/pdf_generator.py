@@ -5,27 +5,89 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import inch
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, BinaryIO, Union
+import io
 import os
 
+from .pdf_stream import PageRecorder, StreamingCanvas
+
 class InvoicePDFGenerator:
+    """
+    Invoice PDFs. `output` is a file path or any writable binary file
+    (BytesIO, a socket file, ...), so nothing has to go through disk;
+    render() returns the bytes. The paragraph and table styles are built
+    once here and shared by every invoice this generator renders.
+    """
+
     def __init__(self):
         self.styles = getSampleStyleSheet()
-        
-    def generate_standard_invoice(self, invoice_data: Dict[str, Any], output_path: str):
-        """Generate standard invoice PDF"""
-        doc = SimpleDocTemplate(output_path, pagesize=A4)
-        elements = []
-        
-        # Title
-        title_style = ParagraphStyle(
+
+        self.title_style = ParagraphStyle(
             'CustomTitle',
             parent=self.styles['Heading1'],
             fontSize=16,
             spaceAfter=30,
             alignment=1
         )
-        elements.append(Paragraph("TAX INVOICE", title_style))
+        self.footer_style = ParagraphStyle(
+            'Footer',
+            parent=self.styles['Normal'],
+            fontSize=8,
+            alignment=1,
+            textColor=colors.grey
+        )
+        self.company_table_style = TableStyle([
+            ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ])
+        self.items_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 10),
+            ('FONT', (0, 1), (-1, -1), 'Helvetica', 9),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ])
+        self.totals_table_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+            ('FONT', (0, 0), (-1, -1), 'Helvetica-Bold', 10),
+            ('FONT', (3, 2), (4, 2), 'Helvetica-Bold', 12),
+        ])
+
+    def _template(self, template_type: str):
+        if template_type == "detailed":
+            return self.generate_detailed_invoice
+        if template_type == "simplified":
+            return self.generate_simplified_invoice
+        return self.generate_standard_invoice
+
+    def render(self, invoice_data: Dict[str, Any], template_type: str = "standard") -> bytes:
+        """The invoice PDF of `template_type` as bytes, built in memory."""
+        buffer = io.BytesIO()
+        self._template(template_type)(invoice_data, buffer)
+        return buffer.getvalue()
+
+    def record(self, invoice_data: Dict[str, Any], template_type: str = "standard") -> PageRecorder:
+        """
+        The invoice's pages kept in a PageRecorder, to be joined with other
+        documents by PdfStreamWriter.add_recorded() (see invoice_batch.py).
+        """
+        recorder = PageRecorder()
+        self._template(template_type)(
+            invoice_data, io.BytesIO(),
+            canvasmaker=lambda filename, **kwargs: StreamingCanvas(recorder, **kwargs),
+        )
+        return recorder
+
+    def generate_standard_invoice(self, invoice_data: Dict[str, Any], output: Union[str, BinaryIO],
+                                  canvasmaker=canvas.Canvas):
+        """Generate standard invoice PDF"""
+        doc = SimpleDocTemplate(output, pagesize=A4)
+        elements = []
+        
+        # Title
+        elements.append(Paragraph("TAX INVOICE", self.title_style))
         
         # Company and Client Details
         company_info = [
@@ -37,10 +99,7 @@ class InvoicePDFGenerator:
         ]
         
         company_table = Table(company_info, colWidths=[2.5*inch, 0.5*inch, 2.5*inch])
-        company_table.setStyle(TableStyle([
-            ('FONT', (0, 0), (-1, -1), 'Helvetica', 10),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ]))
+        company_table.setStyle(self.company_table_style)
         elements.append(company_table)
         elements.append(Spacer(1, 20))
         
@@ -58,15 +117,7 @@ class InvoicePDFGenerator:
             ])
         
         items_table = Table(items_data, colWidths=[0.4*inch, 3*inch, 0.8*inch, 0.8*inch, 1*inch, 1*inch])
-        items_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 10),
-            ('FONT', (0, 1), (-1, -1), 'Helvetica', 9),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ]))
+        items_table.setStyle(self.items_table_style)
         elements.append(items_table)
         elements.append(Spacer(1, 20))
         
@@ -78,34 +129,25 @@ class InvoicePDFGenerator:
         ]
         
         totals_table = Table(totals_data, colWidths=[0.4*inch, 3*inch, 0.8*inch, 1.8*inch, 1*inch])
-        totals_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-            ('FONT', (0, 0), (-1, -1), 'Helvetica-Bold', 10),
-            ('FONT', (3, 2), (4, 2), 'Helvetica-Bold', 12),
-        ]))
+        totals_table.setStyle(self.totals_table_style)
         elements.append(totals_table)
         
         # Footer
         elements.append(Spacer(1, 30))
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=self.styles['Normal'],
-            fontSize=8,
-            alignment=1,
-            textColor=colors.grey
-        )
-        elements.append(Paragraph("Thank you for your business!", footer_style))
-        elements.append(Paragraph("This is a computer generated invoice.", footer_style))
+        elements.append(Paragraph("Thank you for your business!", self.footer_style))
+        elements.append(Paragraph("This is a computer generated invoice.", self.footer_style))
         
-        doc.build(elements)
-        return output_path
+        doc.build(elements, canvasmaker=canvasmaker)
+        return output
     
-    def generate_detailed_invoice(self, invoice_data: Dict[str, Any], output_path: str):
+    def generate_detailed_invoice(self, invoice_data: Dict[str, Any], output: Union[str, BinaryIO],
+                                  canvasmaker=canvas.Canvas):
         """Generate detailed invoice with additional information"""
         # Similar implementation with more details
-        return self.generate_standard_invoice(invoice_data, output_path)
+        return self.generate_standard_invoice(invoice_data, output, canvasmaker)
     
-    def generate_simplified_invoice(self, invoice_data: Dict[str, Any], output_path: str):
+    def generate_simplified_invoice(self, invoice_data: Dict[str, Any], output: Union[str, BinaryIO],
+                                    canvasmaker=canvas.Canvas):
         """Generate simplified invoice"""
         # Similar implementation with minimal details
-        return self.generate_standard_invoice(invoice_data, output_path)
\ No newline at end of file
+        return self.generate_standard_invoice(invoice_data, output, canvasmaker)
\ No newline at end of file
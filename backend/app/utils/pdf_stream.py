@@ -0,0 +1,219 @@
+"""
+PDF output written page by page, for documents too long to keep whole.
+
+reportlab's Canvas holds every finished page until save(). StreamingCanvas
+is a Canvas that hands each page to a PdfStreamWriter as soon as it is
+shown; the writer turns it into PDF objects right away, so only the
+current page and the xref offsets stay in memory. The caller drains the
+bytes with take() (e.g. from a StreamingResponse generator).
+
+Drawing works as on a normal canvas as long as it sticks to text, lines,
+shapes and forms (beginForm / doForm) in the standard 14 fonts - images,
+links and outlines are not written. A form is written when endForm() is
+called, so define it before the pages that use it are shown.
+
+A StreamingCanvas over a PageRecorder keeps the finished pages instead
+(compressed, picklable); PdfStreamWriter.add_recorded() writes them out
+later with their own fonts and forms. That is how documents drawn in
+parts by several processes are put together.
+"""
+
+import zlib
+
+from reportlab.lib.rl_accel import fp_str
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.pdfdoc import pdfdocEnc
+from reportlab.pdfgen import canvas
+
+# fonts whose encoding has to be named in the font dict; the symbol fonts
+# use their built-in one
+_NAMED_ENCODINGS = ("WinAnsiEncoding", "MacRomanEncoding", "MacExpertEncoding")
+
+
+def _deflate(content: bytes, compress: bool):
+    return (zlib.compress(content), True) if compress else (content, False)
+
+
+class PdfStreamWriter:
+    """
+    Serialises a PDF as it is produced. Objects 1-3 (catalog, page tree,
+    shared resources) are reserved up front and written last, since they
+    list pages and fonts that are only known at the end.
+    """
+
+    def __init__(self, compress: bool = True):
+        self.compress = compress
+        self.pages = 0
+        self._out = bytearray()
+        self._pos = 0
+        self._offsets = []
+        self._kids = []
+        self._forms = {}
+        self._catalog = self._reserve()
+        self._page_tree = self._reserve()
+        self._resources = self._reserve()
+        self._emit(b"%PDF-1.4\n%\x93\x8c\x8b\x9e\n")
+
+    def _reserve(self) -> int:
+        self._offsets.append(None)
+        return len(self._offsets)
+
+    def _emit(self, data: bytes):
+        self._out += data
+        self._pos += len(data)
+
+    def _write_object(self, num: int, body: bytes):
+        self._offsets[num - 1] = self._pos
+        self._emit(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+
+    def _write_stream(self, data: bytes, deflated: bool, extra: str = "") -> int:
+        num = self._reserve()
+        head = "<< %s/Length %d%s >>" % (
+            extra, len(data), " /Filter /FlateDecode" if deflated else ""
+        )
+        self._write_object(num, head.encode("latin-1") + b"\nstream\n" + data + b"\nendstream")
+        return num
+
+    def _write_page(self, data: bytes, deflated: bool, width: float, height: float,
+                    resources: int):
+        contents = self._write_stream(data, deflated)
+        num = self._reserve()
+        self._write_object(num, (
+            "<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] "
+            "/Resources %d 0 R /Contents %d 0 R >>"
+            % (self._page_tree, fp_str(width), fp_str(height), resources, contents)
+        ).encode("latin-1"))
+        self._kids.append(num)
+        self.pages += 1
+
+    def _write_form(self, data: bytes, deflated: bool, bbox, resources: int) -> int:
+        return self._write_stream(data, deflated, (
+            "/Type /XObject /Subtype /Form /BBox [%s] /Matrix [1 0 0 1 0 0] "
+            "/Resources %d 0 R " % (" ".join(fp_str(v) for v in bbox), resources)
+        ))
+
+    def _write_resources(self, num: int, fonts: dict, forms: dict):
+        font_refs = []
+        for font_name, internal in fonts.items():
+            font = pdfmetrics.getFont(font_name)
+            if font.face.name not in pdfmetrics.standardFonts:
+                raise ValueError(f"{font_name} is not a standard font, can't stream it")
+            body = f"<< /Type /Font /Subtype /Type1 /Name {internal} /BaseFont /{font.face.name}"
+            if font.encoding.name in _NAMED_ENCODINGS:
+                body += f" /Encoding /{font.encoding.name}"
+            font_num = self._reserve()
+            self._write_object(font_num, (body + " >>").encode("latin-1"))
+            font_refs.append(f"{internal} {font_num} 0 R")
+
+        resources = "<< /Font << %s >> /ProcSet [/PDF /Text]" % " ".join(font_refs)
+        if forms:
+            resources += " /XObject << %s >>" % " ".join(
+                f"/{name} {form_num} 0 R" for name, form_num in forms.items()
+            )
+        self._write_object(num, (resources + " >>").encode("latin-1"))
+
+    def add_page(self, content: bytes, width: float, height: float):
+        data, deflated = _deflate(content, self.compress)
+        self._write_page(data, deflated, width, height, self._resources)
+
+    def add_form(self, name: str, content: bytes, bbox):
+        """Form XObject `name` (as used in Do, e.g. "FormXob.header")."""
+        data, deflated = _deflate(content, self.compress)
+        self._forms[name] = self._write_form(data, deflated, bbox, self._resources)
+
+    def add_recorded(self, recorder: "PageRecorder"):
+        """Append the pages of a PageRecorder, with its own fonts and forms."""
+        resources = self._reserve()
+        forms = {
+            name: self._write_form(data, deflated, bbox, resources)
+            for name, (data, deflated, bbox) in recorder.forms.items()
+        }
+        for data, deflated, width, height in recorder.pages:
+            self._write_page(data, deflated, width, height, resources)
+        self._write_resources(resources, recorder.fonts, forms)
+
+    def close(self, fonts: dict):
+        """
+        Write fonts, resources, page tree, catalog and the xref table.
+        fonts maps reportlab font names to their internal names ("/F1").
+        """
+        self._write_resources(self._resources, fonts, self._forms)
+        self._write_object(self._page_tree, (
+            "<< /Type /Pages /Kids [%s] /Count %d >>"
+            % (" ".join(f"{k} 0 R" for k in self._kids), len(self._kids))
+        ).encode("latin-1"))
+        self._write_object(
+            self._catalog, b"<< /Type /Catalog /Pages %d 0 R >>" % self._page_tree
+        )
+
+        xref = self._pos
+        self._emit(b"xref\n0 %d\n0000000000 65535 f \n" % (len(self._offsets) + 1))
+        self._emit(b"".join(b"%010d 00000 n \n" % off for off in self._offsets))
+        self._emit(
+            b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(self._offsets) + 1, self._catalog, xref)
+        )
+
+    def take(self) -> bytes:
+        """The bytes written since the last take()."""
+        data = bytes(self._out)
+        self._out.clear()
+        return data
+
+
+class PageRecorder:
+    """
+    Stands in for a PdfStreamWriter and keeps what a StreamingCanvas
+    shows - pages, forms, the fonts used - for PdfStreamWriter.add_recorded().
+    """
+
+    def __init__(self, compress: bool = True):
+        self.compress = compress
+        self.pages = []     # (data, deflated, width, height)
+        self.forms = {}     # name -> (data, deflated, bbox)
+        self.fonts = {}
+
+    def add_page(self, content: bytes, width: float, height: float):
+        self.pages.append((*_deflate(content, self.compress), width, height))
+
+    def add_form(self, name: str, content: bytes, bbox):
+        self.forms[name] = (*_deflate(content, self.compress), tuple(bbox))
+
+    def close(self, fonts: dict):
+        self.fonts = dict(fonts)
+
+
+class StreamingCanvas(canvas.Canvas):
+    """Canvas that writes every page to `writer` when it is shown."""
+
+    def __init__(self, writer, **kwargs):
+        # the filename is never used: save() writes to the writer
+        super().__init__("stream.pdf", **kwargs)
+        self._writer = writer
+
+    def showPage(self):
+        code = self._code
+        code.append(" ")
+        stream = "\n".join(
+            self._psCommandsBeforePage + [self._preamble] + code + self._psCommandsAfterPage
+        ) + "\n"
+        width, height = self._pagesize
+        self._writer.add_page(pdfdocEnc(stream), width, height)
+        if self._onPage:
+            self._onPage(self._pageNumber)
+        self._startPage()
+
+    def endForm(self, **extra_attributes):
+        name, lowerx, lowery, upperx, uppery = self._formData
+        width, height = self._pagesize
+        bbox = (lowerx, lowery, width if upperx is None else upperx,
+                height if uppery is None else uppery)
+        stream = "\n".join([self._preamble] + self._code)
+        self._writer.add_form(self._doc.getXObjectName(name), pdfdocEnc(stream), bbox)
+        self._restartAccumulators()
+        self.pop_state_stack()
+
+    def save(self):
+        if len(self._code):
+            self.showPage()
+        self._writer.close(self._doc.fontMapping)
@@ -0,0 +1,87 @@
+"""
+The process pool CPU-heavy work is handed to: the fuzzy part of SSR
+match batches (ssr_loader.match_ssr_batch), bill PDF page ranges
+(bill_pdf.render_materials_bill) and invoice PDFs (invoice_batch).
+
+There is one pool of POOL_WORKERS processes for the whole server,
+started on first use and kept until shutdown(), so concurrent requests
+queue for the same workers instead of each starting a pool of its own.
+
+Workers are started by a fork server (a clean, single-threaded process)
+where the platform has one, else spawned; they are never forked from
+the server process itself. That one runs threads (request handlers, the
+catalogue watcher, render jobs), and a child forked while one of them
+held a lock would start with that lock held for good. So a worker
+starts empty and loads what it needs (e.g. the catalogue) on first use,
+and work functions return counters instead of updating the caller's.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+WORKERS = int(os.getenv("POOL_WORKERS", os.cpu_count() or 1))
+
+# imported once in the fork server, so workers start with them loaded
+PRELOAD = [f"{__package__}.{name}" for name in ("ssr_loader", "bill_pdf", "pdf_generator")]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(PRELOAD)
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def _get() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=_context())
+        return _pool
+
+
+def _discard(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def submit(fn, *args):
+    """
+    Future of fn(*args) run in the shared pool. A pool broken by a
+    worker that died is replaced by a fresh one.
+    """
+    pool = _get()
+    try:
+        return pool.submit(fn, *args)
+    except BrokenProcessPool:
+        _discard(pool)
+        return _get().submit(fn, *args)
+
+
+def map(fn, *iterables) -> list:
+    """[fn(*args) for args in zip(*iterables)], run in the shared pool."""
+    futures = [submit(fn, *args) for args in zip(*iterables)]
+    try:
+        return [future.result() for future in futures]
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def shutdown():
+    """Stop the workers (at app shutdown); the next submit() starts new ones."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
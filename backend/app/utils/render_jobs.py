@@ -0,0 +1,308 @@
+"""
+Background render jobs for exports too slow for one request.
+
+    POST /jobs {"kind": "materials_bill_pdf"}  -> 202, the job (with its id)
+    POST /jobs {"kind": "invoice_batch_zip", "params": {"date_from": ...}}
+    GET  /jobs/{id}                            -> queued / running / done / failed
+    GET  /jobs/{id}/download                   -> the file, once done
+
+Jobs run on a small thread pool of their own (RENDER_JOB_WORKERS), not
+on the threads that serve requests, and each uvicorn worker accepts at
+most RENDER_JOB_MAX_PENDING queued or running jobs (then 429). The job
+rows live in the render_jobs table, so any worker can answer a poll or
+download for a job another one ran; the artifacts are files in
+RENDER_JOB_DIR.
+
+Finished jobs and their files are removed after RENDER_JOB_TTL seconds,
+checked at startup and then every RENDER_JOB_CLEANUP_INTERVAL seconds;
+jobs still queued or running after RENDER_JOB_TTL are marked failed.
+Each process records a boot id of its own on the jobs it runs. At
+startup, queued or running jobs of any other boot id (a process that was
+restarted or crashed) are marked failed, and at shutdown a process marks
+its own unfinished jobs failed.
+"""
+
+import json
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from .. import crud, models, schemas
+from ..database import SessionLocal
+from . import bill_cache, invoice_batch
+from .bill_excel import render_materials_bill_xlsx
+from .bill_pdf import STREAM_CHUNK_ROWS, render_materials_bill
+
+WORKERS = int(os.getenv("RENDER_JOB_WORKERS", 2))
+MAX_PENDING = int(os.getenv("RENDER_JOB_MAX_PENDING", 20))
+JOB_TTL = float(os.getenv("RENDER_JOB_TTL", 24 * 3600))
+CLEANUP_INTERVAL = float(os.getenv("RENDER_JOB_CLEANUP_INTERVAL", 3600))
+JOB_DIR = os.getenv(
+    "RENDER_JOB_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "render_jobs"),
+)
+
+
+class JobError(Exception):
+    """A job that can't be rendered (e.g. nothing to export); shown as its error."""
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def _materials_bill(kind: str, render):
+    def run(db, params: dict) -> str:
+        if not crud.has_materials(db):
+            raise JobError("No materials to include in bill")
+        path = _artifact_path(params["job_id"], kind)
+        if bill_cache.ENABLED:
+            key = bill_cache.bill_key(kind, crud.bill_rows(db).yield_per(STREAM_CHUNK_ROWS))
+            cached = bill_cache.lookup(key, kind)
+            if cached is not None:
+                try:
+                    # a copy: bill_cache.prune() may remove the cached file at any time
+                    shutil.copyfile(cached, path)
+                    return path
+                except FileNotFoundError:
+                    pass
+        # read in chunks; cached under the key of the rows actually drawn
+        rows = bill_cache.KeyedRows(kind, crud.bill_rows(db).yield_per(STREAM_CHUNK_ROWS))
+        data = render(rows)
+        with open(path, "wb") as f:
+            f.write(data)
+        if bill_cache.ENABLED:
+            bill_cache.store(rows.key, kind, data)
+        return path
+    return run
+
+
+def _invoice_batch(fmt: str):
+    def run(db, params: dict) -> str:
+        # params as for POST /invoices/batch/pdf
+        req = schemas.InvoiceBatchExport(**{**params, "format": fmt})
+        try:
+            invoice_batch.check_request(req)
+        except ValueError as e:
+            raise JobError(str(e))
+        query = crud.invoices_for_export(db, req.invoice_ids, req.date_from, req.date_to)
+        if query.first() is None:
+            raise JobError("No invoices match")
+        path = _artifact_path(params["job_id"], fmt)
+        # iter_invoices expunges as it goes: not on the session holding the job
+        batch_db = SessionLocal()
+        try:
+            with open(path, "wb") as f:
+                for chunk in invoice_batch.stream_batch(batch_db, req):
+                    f.write(chunk)
+        finally:
+            batch_db.close()
+        return path
+    return run
+
+
+# kind -> (run(db, params) -> artifact path, download filename, media type)
+JOB_KINDS = {
+    "materials_bill_pdf": (
+        _materials_bill("pdf", render_materials_bill),
+        "materials_bill.pdf",
+        "application/pdf",
+    ),
+    "materials_bill_excel": (
+        _materials_bill("xlsx", render_materials_bill_xlsx),
+        "materials_bill.xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+    "invoice_batch_zip": (_invoice_batch("zip"), *invoice_batch.FORMATS["zip"]),
+    "invoice_batch_pdf": (_invoice_batch("pdf"), *invoice_batch.FORMATS["pdf"]),
+}
+
+
+def _artifact_path(job_id: str, ext: str) -> str:
+    return os.path.join(JOB_DIR, f"{job_id}.{ext}")
+
+
+class RenderJobQueue:
+    """Submits jobs to the pool and records their progress in the DB."""
+
+    def __init__(self, workers: int = WORKERS, max_pending: int = MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.boot_id = None
+        self._cleaner = None
+        self._stop = threading.Event()
+        self.completed = 0
+        self.failed = 0
+
+    def start(self, cleanup_interval: float = CLEANUP_INTERVAL):
+        """
+        Mark jobs of earlier processes that never finished as failed and
+        drop expired ones, then keep dropping them every `cleanup_interval`
+        seconds in a daemon thread (0 = only now).
+        """
+        # a PID can be reused by the next start (e.g. PID 1 in a container)
+        self.boot_id = uuid.uuid4().hex
+        db = SessionLocal()
+        try:
+            orphaned = self._unfinished(db).filter(
+                models.RenderJob.boot_id.is_(None) | (models.RenderJob.boot_id != self.boot_id)
+            )
+            self._fail(db, orphaned, "Interrupted: the server was restarted")
+            self.cleanup(db)
+        except Exception as e:
+            # e.g. another worker cleaning up the same rows
+            print(f"Render job cleanup failed: {e}")
+        finally:
+            db.close()
+
+        if cleanup_interval <= 0 or self._cleaner is not None:
+            return
+        self._stop.clear()
+
+        def clean():
+            while not self._stop.wait(cleanup_interval):
+                db = SessionLocal()
+                try:
+                    self.cleanup(db)
+                except Exception as e:
+                    print(f"Render job cleanup failed: {e}")
+                finally:
+                    db.close()
+
+        self._cleaner = threading.Thread(target=clean, name="render-job-cleanup", daemon=True)
+        self._cleaner.start()
+
+    @staticmethod
+    def _unfinished(db):
+        return db.query(models.RenderJob).filter(
+            models.RenderJob.status.in_(["queued", "running"])
+        )
+
+    @staticmethod
+    def _fail(db, jobs, error: str):
+        for job in jobs.all():
+            job.status = "failed"
+            job.error = error
+            job.finished_at = datetime.utcnow()
+        db.commit()
+
+    def cleanup(self, db):
+        """
+        Fail jobs still unfinished after JOB_TTL, and remove finished jobs
+        older than JOB_TTL with their files.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=JOB_TTL)
+        stuck = self._unfinished(db).filter(models.RenderJob.created_at < cutoff)
+        self._fail(db, stuck, "Timed out: not finished within the job TTL")
+        expired = (
+            db.query(models.RenderJob)
+            .filter(models.RenderJob.status.in_(["done", "failed"]))
+            .filter(models.RenderJob.finished_at < cutoff)
+            .all()
+        )
+        for job in expired:
+            if job.artifact_path:
+                try:
+                    os.remove(job.artifact_path)
+                except FileNotFoundError:
+                    pass
+            db.delete(job)
+        db.commit()
+
+    def submit(self, db, kind: str, params: dict = None) -> models.RenderJob:
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind {kind!r}, expected one of {sorted(JOB_KINDS)}")
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} render jobs already pending")
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="render-job")
+
+        try:
+            job = crud.create_render_job(db, kind, params)
+            job.boot_id = self.boot_id
+            db.commit()
+            self._executor.submit(self._run, job.id)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job
+
+    def _run(self, job_id: str):
+        db = SessionLocal()
+        try:
+            job = crud.get_render_job(db, job_id)
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            db.commit()
+
+            run, filename, media_type = JOB_KINDS[job.kind]
+            params = {**json.loads(job.params or "{}"), "job_id": job.id}
+            try:
+                os.makedirs(JOB_DIR, exist_ok=True)
+                path = run(db, params)
+            except Exception as e:
+                db.rollback()
+                job.status = "failed"
+                job.error = str(e) if isinstance(e, JobError) else f"{type(e).__name__}: {e}"
+                failed = True
+            else:
+                job.status = "done"
+                job.artifact_path = path
+                job.filename = filename
+                job.media_type = media_type
+                job.size_bytes = os.path.getsize(path)
+                failed = False
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            with self._lock:
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+        except Exception as e:
+            print(f"Render job {job_id} could not be recorded: {e}")
+        finally:
+            db.close()
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self):
+        """Cancel the queued jobs and mark this process's unfinished jobs failed."""
+        self._stop.set()
+        self._cleaner = None
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if self.boot_id is None:
+            return
+
+        db = SessionLocal()
+        try:
+            mine = self._unfinished(db).filter(models.RenderJob.boot_id == self.boot_id)
+            self._fail(db, mine, "Interrupted: the server shut down")
+        except Exception as e:
+            print(f"Render job shutdown failed: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+jobs = RenderJobQueue()
@@ -1,10 +1,20 @@
 # app/utils/ssr_loader.py
 
 import os
+import re
 import json
-from functools import lru_cache
+import bisect
+import heapq
+import threading
+from collections import Counter, OrderedDict
 from difflib import SequenceMatcher
 
+import numpy as np
+
+from . import process_pool
+from .catalog import BoqTable, SsrTable, catalogs
+from .ssr_tfidf import TfidfIndex
+
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "sample_data")
 
@@ -12,6 +22,164 @@ DATA_DIR = os.path.join(BASE_DIR, "sample_data")
 SSR_JSON = os.path.join(DATA_DIR, "ssr_data.json")
 BOQ_JSON = os.path.join(DATA_DIR, "BOQ.json")
 
+# Fuzzy matching: minimum SequenceMatcher ratio to accept a row, and how many
+# trigram-shortlisted rows the (expensive) ratio is computed on.
+FUZZY_THRESHOLD = 0.80
+FUZZY_SHORTLIST_SIZE = 50
+
+# Skip ratio() for rows whose cheap upper bounds (length, character
+# multiset) show they can't matter. Same results; False for comparisons.
+FUZZY_PRUNING = True
+
+# Engine that picks the fuzzy candidates SequenceMatcher re-ranks:
+#   "trigram" - trigram Dice shortlist (default)
+#   "tfidf"   - top TFIDF_RERANK_SIZE rows by char n-gram TF-IDF cosine
+#   "full"    - every rated row (the original scan, for comparisons)
+MATCH_ENGINE = os.getenv("SSR_MATCH_ENGINE", "trigram")
+TFIDF_RERANK_SIZE = 10
+
+# match_ssr_batch: pool workers the fuzzy part of a batch is spread over,
+# and the number of fuzzy lookups below which it isn't worth sending out
+BATCH_WORKERS = int(os.getenv("SSR_BATCH_WORKERS", process_pool.WORKERS))
+BATCH_PARALLEL_MIN = 32
+
+# Words for the typeahead index (suggest_ssr)
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# Max normalised descriptions kept in the match result cache
+RATE_CACHE_SIZE = int(os.getenv("SSR_RATE_CACHE_SIZE", 2048))
+
+# How each fetch_ssr_rate call was resolved, see get_match_stats()
+_match_stats = Counter()
+_match_stats_lock = threading.Lock()
+
+
+class MatchCache:
+  """
+  Bounded LRU of normalised description -> match_ssr result (the matched
+  SSR row and BOQ item no, or None). Amounts are not cached: they depend
+  on the quantity and are recomputed per call.
+
+  Entries carry the catalogue version they were computed against, so a
+  lookup that was in flight during a catalogue reload can't put a stale
+  result back.
+  """
+
+  def __init__(self, maxsize: int):
+      self.maxsize = maxsize
+      self.generation = 0
+      self._data = OrderedDict()
+      self._lock = threading.Lock()
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0
+
+  def get(self, key: str):
+      """(True, value) on a hit, (False, None) on a miss."""
+      with self._lock:
+          if key in self._data:
+              self._data.move_to_end(key)
+              self.hits += 1
+              return True, self._data[key]
+          self.misses += 1
+          return False, None
+
+  def put(self, key: str, value, generation: int):
+      with self._lock:
+          if generation != self.generation or self.maxsize <= 0:
+              return
+          self._data[key] = value
+          self._data.move_to_end(key)
+          while len(self._data) > self.maxsize:
+              self._data.popitem(last=False)
+              self.evictions += 1
+
+  def invalidate(self, generation: int):
+      with self._lock:
+          self._data.clear()
+          self.generation = generation
+
+  def stats(self) -> dict:
+      with self._lock:
+          lookups = self.hits + self.misses
+          return {
+              "size": len(self._data),
+              "maxsize": self.maxsize,
+              "hits": self.hits,
+              "misses": self.misses,
+              "evictions": self.evictions,
+              "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+          }
+
+
+_match_cache = MatchCache(RATE_CACHE_SIZE)
+catalogs.add_listener(lambda catalog: _match_cache.invalidate(catalog.version))
+
+
+class _Flight:
+  __slots__ = ("done", "result", "error")
+
+  def __init__(self):
+      self.done = threading.Event()
+      self.result = None
+      self.error = None
+
+
+class SingleFlight:
+  """
+  Coalesces concurrent identical computations: the first caller for a key
+  runs it, callers arriving while it runs wait and get the same result
+  (or exception) instead of repeating the work. Nothing is kept once the
+  computation finishes - that is the match cache's job.
+  """
+
+  def __init__(self):
+      self._flights = {}
+      self._lock = threading.Lock()
+      self.computed = 0
+      self.coalesced = 0
+
+  def do(self, key, fn):
+      with self._lock:
+          flight = self._flights.get(key)
+          leader = flight is None
+          if leader:
+              flight = self._flights[key] = _Flight()
+              self.computed += 1
+          else:
+              self.coalesced += 1
+
+      if not leader:
+          flight.done.wait()
+          if flight.error is not None:
+              raise flight.error
+          return flight.result
+
+      try:
+          flight.result = fn()
+          return flight.result
+      except BaseException as e:
+          flight.error = e
+          raise
+      finally:
+          with self._lock:
+              del self._flights[key]
+          flight.done.set()
+
+  def stats(self) -> dict:
+      with self._lock:
+          calls = self.computed + self.coalesced
+          return {
+              "in_flight": len(self._flights),
+              "computed": self.computed,
+              "coalesced": self.coalesced,
+              "coalesced_ratio": round(self.coalesced / calls, 4) if calls else 0.0,
+          }
+
+
+# Identical match_ssr lookups running at the same time share one scan
+_match_flights = SingleFlight()
+
 
 def _normalise(text: str) -> str:
   """
@@ -30,10 +198,32 @@ def _normalise(text: str) -> str:
   return " ".join(str(text).lower().split())
 
 
-@lru_cache(maxsize=1)
-def _load_ssr_data():
+def _canonical(norm: str) -> str:
   """
-  Load SSR data from JSON once and precompute a normalised field.
+  Whitespace/punctuation-insensitive key of an already normalised string.
+
+  Many SSR descriptions were extracted with their spaces dropped
+  ("fixingchainagestone/benchmarkstone..."), so "fixing chainage stone /
+  benchmark stone ..." only meets them on this key.
+  """
+  return re.sub(r"[\W_]+", "", norm)
+
+
+def _trigrams(text: str) -> set:
+  """
+  Character trigrams of an already normalised string.
+
+  Padded like pg_trgm ("  text ") so short strings and word starts
+  still produce useful grams.
+  """
+  padded = f"  {text} "
+  return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _read_ssr_json():
+  """
+  Load SSR data from JSON into an SsrTable, with normalised
+  description / additional specification columns.
 
   Each JSON record should look like (new structure):
     {
@@ -51,7 +241,10 @@ def _load_ssr_data():
   with open(SSR_JSON, "r", encoding="utf-8") as f:
       raw = json.load(f)
 
-  data = []
+  cols = {name: [] for name in (
+      "ssr_item_no", "reference_no", "description", "additional_specification",
+      "unit", "rate", "norm", "norm_add_spec",
+  )}
   for item in raw:
       desc = item.get("description", "")
       add_spec = item.get("additional_specification", "")
@@ -63,27 +256,170 @@ def _load_ssr_data():
       except (TypeError, ValueError):
           rate_val = 0.0
 
-      data.append(
-          {
-              "ssr_item_no": str(item.get("ssr_item_no", "")).strip(),
-              "reference_no": str(item.get("reference_no", "")).strip(),
-              "description": desc,
-              "additional_specification": add_spec,
-              "unit": str(item.get("unit", "")).strip(),
-              "rate": rate_val,
-              "_norm": _normalise(desc),
-              "_norm_add_spec": _normalise(add_spec),
-          }
-      )
+      cols["ssr_item_no"].append(str(item.get("ssr_item_no", "")).strip())
+      cols["reference_no"].append(str(item.get("reference_no", "")).strip())
+      cols["description"].append(desc)
+      cols["additional_specification"].append(add_spec)
+      cols["unit"].append(str(item.get("unit", "")).strip())
+      cols["rate"].append(rate_val)
+      cols["norm"].append(_normalise(desc))
+      cols["norm_add_spec"].append(_normalise(add_spec))
+
+  ssr = SsrTable(**cols)
+  print(f"Loaded {len(ssr)} SSR records from JSON.")
+  return ssr
+
+
+def _position_dtype(size: int):
+  """Smallest integer dtype that holds row positions 0..size-1."""
+  return np.uint16 if size <= np.iinfo(np.uint16).max else np.int32
+
+
+def _build_ssr_index(ssr: SsrTable) -> dict:
+  """
+  Build lookup indexes over the SSR data.
+
+  Only rows with rate > 0 are indexed (the only rows a match may return):
+
+  - "by_norm": normalised description -> list of row positions
+  - "by_canon": canonical key (see _canonical) -> list of row positions
+  - "gram_ids": trigram -> column id in the postings below
+  - "postings" / "postings_ptr": row positions having trigram id g are
+    postings[postings_ptr[g]:postings_ptr[g + 1]] (CSR, NumPy arrays;
+    positions as uint16 while the catalogue has fewer than 65536 rows)
+  - "trigram_counts": number of distinct trigrams per row position
+  - "words": sorted distinct words, and "word_postings" / "word_ptr":
+    rows containing words[w] are word_postings[word_ptr[w]:word_ptr[w + 1]].
+    Words sharing a prefix are adjacent, so a prefix is one slice.
+  """
+  by_norm = {}
+  by_canon = {}
+  gram_ids = {}
+  rows, cols = [], []
+  word_rows = {}
+  trigram_counts = np.zeros(len(ssr), dtype=np.int32)
+  for pos in np.flatnonzero(ssr.rate > 0).tolist():
+      norm = ssr.norm[pos]
+      by_norm.setdefault(norm, []).append(pos)
+      canon = _canonical(norm)
+      if canon:
+          by_canon.setdefault(canon, []).append(pos)
+
+      grams = _trigrams(norm)
+      trigram_counts[pos] = len(grams)
+      for gram in grams:
+          rows.append(pos)
+          cols.append(gram_ids.setdefault(gram, len(gram_ids)))
+
+      for word in set(_WORD_RE.findall(norm)):
+          word_rows.setdefault(word, []).append(pos)
+
+  rows = np.asarray(rows, dtype=_position_dtype(len(ssr)))
+  cols = np.asarray(cols, dtype=np.int32)
+  postings_ptr = np.zeros(len(gram_ids) + 1, dtype=np.int64)
+  np.cumsum(np.bincount(cols, minlength=len(gram_ids)), out=postings_ptr[1:])
+
+  words = sorted(word_rows)
+  word_ptr = np.zeros(len(words) + 1, dtype=np.int64)
+  np.cumsum([len(word_rows[w]) for w in words], out=word_ptr[1:])
+  word_postings = np.fromiter(
+      (pos for w in words for pos in word_rows[w]),
+      dtype=_position_dtype(len(ssr)),
+      count=int(word_ptr[-1]),
+  )
+
+  return {
+      "by_norm": by_norm,
+      "by_canon": by_canon,
+      "gram_ids": gram_ids,
+      "postings": rows[np.argsort(cols, kind="stable")],
+      "postings_ptr": postings_ptr,
+      "trigram_counts": trigram_counts,
+      "words": words,
+      "word_postings": word_postings,
+      "word_ptr": word_ptr,
+  }
+
 
-  print(f"Loaded {len(data)} SSR records from JSON.")
-  return data
+def _build_canon_keys(catalog):
+  """
+  The canonical keys of the SSR index laid out for suggest_ssr's
+  substring scan: (all keys in one string, each followed by "\n"; start
+  offset of each key; row positions of key i as
+  rows[rows_ptr[i]:rows_ptr[i + 1]]). A key never contains "\n", so a
+  find() hit lies within one key.
+  """
+  keys, starts, rows, rows_ptr = [], [], [], [0]
+  offset = 0
+  for key, positions in catalog.ssr_index["by_canon"].items():
+      keys.append(key + "\n")
+      starts.append(offset)
+      offset += len(key) + 1
+      rows.extend(positions)
+      rows_ptr.append(len(rows))
+  return "".join(keys), starts, rows, rows_ptr
+
+
+def _build_tfidf_index(catalog):
+  """
+  TF-IDF matrix over the rated SSR rows, built on first use of the
+  "tfidf" engine. Returns (TfidfIndex, row positions of its rows).
+  """
+  ssr = catalog.ssr
+  positions = np.flatnonzero(ssr.rate > 0).tolist()
+  return TfidfIndex([ssr.norm[pos] for pos in positions]), positions
+
+
+def _fuzzy_candidates(catalog, query: str) -> list:
+  """
+  SSR row positions (catalogue order) to run SequenceMatcher on,
+  chosen by MATCH_ENGINE.
+  """
+  if MATCH_ENGINE == "trigram":
+      return _trigram_candidates(catalog, query)
+
+  if MATCH_ENGINE == "tfidf":
+      tfidf, positions = catalog.derived("tfidf", _build_tfidf_index)
+      return sorted(positions[i] for i in tfidf.top(query, TFIDF_RERANK_SIZE))
+
+  if MATCH_ENGINE == "full":
+      return np.flatnonzero(catalog.ssr_index["trigram_counts"]).tolist()
+
+  raise ValueError(f"Unknown SSR match engine: {MATCH_ENGINE!r}")
+
+
+def _trigram_candidates(catalog, query: str) -> list:
+  """
+  Shortlist SSR row positions worth running SequenceMatcher on.
+
+  Rows are ranked by trigram Dice similarity with the query and the best
+  FUZZY_SHORTLIST_SIZE are returned in catalogue order, so ties in the final
+  ratio still resolve to the first row like the full scan did.
+  """
+  index = catalog.ssr_index
+  gram_ids = index["gram_ids"]
+  postings = index["postings"]
+  ptr = index["postings_ptr"]
+  counts = index["trigram_counts"]
+
+  q_grams = _trigrams(query)
+  ids = [g for g in map(gram_ids.get, q_grams) if g is not None]
+  if not ids:
+      return []
+
+  rows = np.concatenate([postings[ptr[g]:ptr[g + 1]] for g in ids])
+  shared = np.bincount(rows, minlength=len(counts))
+  dice = 2.0 * shared / (len(q_grams) + counts)
+
+  # stable sort: equal scores keep catalogue order (lowest position first)
+  best = np.argsort(-dice, kind="stable")[:FUZZY_SHORTLIST_SIZE]
+  return sorted(int(pos) for pos in best if shared[pos])
 
 
-@lru_cache(maxsize=1)
-def _load_boq_data():
+def _read_boq_json():
   """
-  Load BOQ data from JSON once and precompute normalised fields.
+  Load BOQ data from JSON into a BoqTable, with normalised description /
+  reference page columns.
 
   BOQ.json records should have:
     {
@@ -92,143 +428,592 @@ def _load_boq_data():
       "Quantity": ...,
       "BOQ_Reference_Page No": "..."
     }
+  ("BOQ Item No" / "BOQ_Item_No" and "Description_of_Work" / "Description"
+  are accepted too, and a {"rows": [...]} / {"data": [...]} wrapper.)
   """
   if not os.path.exists(BOQ_JSON):
       # If BOQ doesn't exist, we simply won't attach a BOQ item no.
       print(f"BOQ JSON file not found: {BOQ_JSON}")
-      return []
+      raw = []
+  else:
+      with open(BOQ_JSON, "r", encoding="utf-8") as f:
+          raw = json.load(f)
 
-  with open(BOQ_JSON, "r", encoding="utf-8") as f:
-      raw = json.load(f)
+  if isinstance(raw, dict):
+      raw = raw.get("rows") or raw.get("data") or []
 
-  data = []
+  cols = {name: [] for name in (
+      "item_no", "description", "quantity", "ref_page", "norm_desc", "norm_ref_page",
+  )}
   for item in raw:
-      desc = item.get("Description of Work", "")
+      desc = (
+          item.get("Description of Work")
+          or item.get("Description_of_Work")
+          or item.get("Description")
+          or ""
+      )
       ref_page = item.get("BOQ_Reference_Page No", "")
-
-      data.append(
-          {
-              "boq_item_no": str(item.get("BOQ_Item_No.", "")).strip(),
-              "description": desc,
-              "quantity": item.get("Quantity", None),
-              "boq_ref_page": ref_page,
-              "_norm_desc": _normalise(desc),
-              "_norm_ref_page": _normalise(ref_page),
-          }
+      item_no = (
+          item.get("BOQ_Item_No.")
+          or item.get("BOQ Item No")
+          or item.get("BOQ_Item_No")
+          or ""
       )
+      try:
+          quantity = float(item.get("Quantity"))
+      except (TypeError, ValueError):
+          quantity = float("nan")
 
-  print(f"Loaded {len(data)} BOQ records from JSON.")
-  return data
+      cols["item_no"].append(str(item_no).strip())
+      cols["description"].append(desc)
+      cols["quantity"].append(quantity)
+      cols["ref_page"].append(str(ref_page))
+      cols["norm_desc"].append(_normalise(desc))
+      cols["norm_ref_page"].append(_normalise(ref_page))
 
+  boq = BoqTable(**cols)
+  print(f"Loaded {len(boq)} BOQ records from JSON.")
+  return boq
 
-def fetch_ssr_rate(description: str, quantity: float = 1.0):
+
+def _build_boq_index(boq: BoqTable) -> dict:
   """
-  Look up SSR rate by description using JSON data.
+  Build lookup indexes over the BOQ rows:
 
-  Strategy (SSR behaviour is EXACTLY your old logic):
+  - "by_desc": normalised description -> list of BOQ row positions (file order)
+  - "by_desc_page": (normalised description, normalised reference page)
+    -> position of the first BOQ row with that pair
+  """
+  by_desc = {}
+  by_desc_page = {}
+  for pos, (desc, page) in enumerate(zip(boq.norm_desc, boq.norm_ref_page)):
+      by_desc.setdefault(desc, []).append(pos)
+      by_desc_page.setdefault((desc, page), pos)
 
-  1) Normalise user description.
-  2) EXACT normalised match (and rate > 0) → use that.
-  3) If not found, FUZZY match with a SAFE THRESHOLD:
-       - compute similarity on normalised text
-       - if best_score >= 0.80 and rate > 0 → use it
-       - else → treat as NOT FOUND → return None.
-  4) For SSR ITEM (match found):
-       - compute base_rate, gst_rate, final_rate, total_amount
-       - THEN try to find BOQ item number by:
-           a) same normalised description in BOQ
-           b) if multiple BOQ rows:
-               compare SSR.additional_specification (normalised)
-               with BOQ_Reference_Page No (normalised)
-               if equal → pick that BOQ item
-               else → fall back to first BOQ candidate.
-  5) If nothing acceptable is found → return None (NON SSR handled by caller).
+  return {"by_desc": by_desc, "by_desc_page": by_desc_page}
+
+
+def _count_match(kind: str):
+  with _match_stats_lock:
+      _match_stats[kind] += 1
+
+
+def get_match_stats() -> dict:
   """
-  ssr_data = _load_ssr_data()
-  boq_data = _load_boq_data()
-  query = _normalise(description)
+  Counts of how fetch_ssr_rate resolved descriptions since start-up:
+  "exact", "canonical", "fuzzy" (accepted) and "not_found".
 
-  if not query:
-      return None
+  "canonical_saved_ratio" is the share of would-be fuzzy scans that the
+  canonical key answered instead. "ratio_scored" / "ratio_pruned" count
+  fuzzy candidate rows that got the full SequenceMatcher.ratio() and
+  those the upper bounds ruled out (batch workers' included).
+  """
+  with _match_stats_lock:
+      stats = {
+          k: _match_stats[k]
+          for k in ("exact", "canonical", "fuzzy", "not_found", "ratio_scored", "ratio_pruned")
+      }
 
-  # 1) Exact match on normalised text, only with valid rate
-  exact_matches = [
-      item for item in ssr_data if item["_norm"] == query and item["rate"] > 0
-  ]
+  scans = stats["canonical"] + stats["fuzzy"] + stats["not_found"]
+  stats["canonical_saved_ratio"] = round(stats["canonical"] / scans, 4) if scans else 0.0
+  return stats
+
+
+def _one_item(ssr, positions) -> bool:
+  """
+  True if the rows are all the same SSR item: one normalised description,
+  or one item no at one rate. Different items can share a canonical key
+  (e.g. two descriptions that differ only in spacing or punctuation).
+  """
+  first = positions[0]
+  if all(ssr.norm[pos] == ssr.norm[first] for pos in positions):
+      return True
+  return all(
+      ssr.ssr_item_no[pos] == ssr.ssr_item_no[first] and ssr.rate[pos] == ssr.rate[first]
+      for pos in positions
+  )
+
+
+def _exact_position(catalog, query: str):
+  """
+  (row position, "exact" | "canonical") for a normalised query, or None.
+  The index only holds rows with a valid rate.
 
+  A canonical key shared by different SSR items doesn't decide between
+  them; those queries go to the fuzzy match, which scores every row.
+  """
+  ssr_index = catalog.ssr_index
+
+  exact_matches = ssr_index["by_norm"].get(query)
   if exact_matches:
-      best = exact_matches[0]
-      # print("EXACT SSR MATCH:", best["ssr_item_no"])
+      return exact_matches[0], "exact"
+
+  canon_matches = ssr_index["by_canon"].get(_canonical(query))
+  if canon_matches and _one_item(catalog.ssr, canon_matches):
+      return canon_matches[0], "canonical"
+
+  return None
+
+
+def _ratio_bounds(matcher, catalog, candidates: list, floor: float) -> list:
+  """
+  [(upper bound of ratio(), row position)] for the candidate rows whose
+  bound reaches `floor`, highest bound first, ties in catalogue order.
+  `matcher` must hold the query as seq2.
+
+  real_quick_ratio() (lengths only) is checked before quick_ratio()
+  (character multisets); both are >= ratio().
+  """
+  norms = catalog.ssr.norm
+  bounds = []
+  for pos in candidates:
+      matcher.set_seq1(norms[pos])
+      if matcher.real_quick_ratio() < floor:
+          continue
+      bound = matcher.quick_ratio()
+      if bound >= floor:
+          bounds.append((-bound, pos))
+  bounds.sort()
+  return [(-neg_bound, pos) for neg_bound, pos in bounds]
+
+
+def _count_ratio_work(candidates: int, scored: int, work: Counter = None):
+  """
+  Add to the ratio_scored / ratio_pruned counters, or to `work` if given
+  (pool workers, whose counters the caller adds up with _add_match_stats).
+  """
+  counts = Counter(ratio_scored=scored, ratio_pruned=candidates - scored)
+  if work is None:
+      _add_match_stats(counts)
   else:
-      # 2) Fuzzy match with threshold, only on items with a valid rate
-      best = None
-      best_score = 0.0
+      work.update(counts)
 
-      for item in ssr_data:
-          if item["rate"] <= 0:
-              continue
-          s = SequenceMatcher(None, item["_norm"], query).ratio()
+
+def _add_match_stats(work: Counter):
+  with _match_stats_lock:
+      _match_stats.update(work)
+
+
+def _fuzzy_position(catalog, query: str, work: Counter = None):
+  """
+  (row position, score) of the best fuzzy match for a normalised query,
+  or (None, best score) if nothing reaches FUZZY_THRESHOLD.
+
+  With FUZZY_PRUNING rows are scored highest upper bound first, and a
+  row only gets the full ratio() while its bound can still reach the
+  threshold and beat the running best. Ties go to the earlier row as
+  in the plain scan, so the match is the same; only a below-threshold
+  best score may come out lower (those rows are never scored).
+
+  The work done is counted into `work` if given (see _count_ratio_work).
+  """
+  norms = catalog.ssr.norm
+  best = None
+  best_score = 0.0
+
+  # b = query stays fixed, so SequenceMatcher only indexes it once
+  matcher = SequenceMatcher(None, "", query)
+  candidates = _fuzzy_candidates(catalog, query)
+
+  if not FUZZY_PRUNING:
+      for pos in candidates:
+          matcher.set_seq1(norms[pos])
+          s = matcher.ratio()
           if s > best_score:
               best_score = s
-              best = item
+              best = pos
+      _count_ratio_work(len(candidates), len(candidates), work)
+
+  else:
+      scored = 0
+      for bound, pos in _ratio_bounds(matcher, catalog, candidates, FUZZY_THRESHOLD):
+          if bound < best_score:
+              break   # every remaining bound is lower still
+          if bound == best_score and pos > best:
+              continue
+          matcher.set_seq1(norms[pos])
+          s = matcher.ratio()
+          scored += 1
+          if s > best_score or (best is not None and s == best_score and pos < best):
+              best_score = s
+              best = pos
+      _count_ratio_work(len(candidates), scored, work)
+
+  # Threshold – if too low, treat as NOT FOUND
+  if best is None or best_score < FUZZY_THRESHOLD:
+      return None, best_score
+  return best, best_score
+
+
+def _fuzzy_top_positions(catalog, query: str, k: int) -> list:
+  """
+  [(row position, score)] of the k best fuzzy scores for a normalised
+  query, best first, threshold not applied. Same rows and ratio as
+  _fuzzy_position, one pass; a size-k min-heap holds the running top k
+  and equal scores keep the earlier row. With FUZZY_PRUNING, rows whose
+  upper bound can't displace the weakest kept one are not scored.
+  """
+  norms = catalog.ssr.norm
+  heap = []   # (score, -pos): heap[0] is the weakest kept candidate
+
+  matcher = SequenceMatcher(None, "", query)
+  candidates = _fuzzy_candidates(catalog, query)
+  if FUZZY_PRUNING:
+      ranked = _ratio_bounds(matcher, catalog, candidates, 0.0)
+  else:
+      ranked = [(1.0, pos) for pos in candidates]
 
-      # Threshold – if too low, treat as NOT FOUND
-      if best is None or best_score < 0.80:
-          # print("NO GOOD SSR MATCH, best_score:", best_score)
+  scored = 0
+  for bound, pos in ranked:
+      if len(heap) == k and (bound, -pos) <= heap[0]:
+          if bound < heap[0][0]:
+              break   # every remaining bound is lower still
+          continue
+      matcher.set_seq1(norms[pos])
+      entry = (matcher.ratio(), -pos)
+      scored += 1
+      if len(heap) < k:
+          heapq.heappush(heap, entry)
+      elif entry > heap[0]:
+          heapq.heapreplace(heap, entry)
+  _count_ratio_work(len(candidates), scored)
+
+  return [(-neg_pos, score) for score, neg_pos in sorted(heap, reverse=True)]
+
+
+def _fuzzy_positions(queries: list, sources: dict):
+  """
+  _fuzzy_position for several queries, the unit of work of batch workers:
+  (results, work counters for _add_match_stats).
+
+  The worker's catalogue is (re)loaded to match `sources`; None if it
+  can't be, e.g. the files changed again - positions would not line up
+  with the caller's.
+  """
+  catalog = catalogs.current()
+  if catalog.sources != sources:
+      catalog = catalogs.reload(if_changed=True)
+      if catalog.sources != sources:
           return None
+  work = Counter()
+  return [_fuzzy_position(catalog, q, work) for q in queries], work
+
+
+def _build_ssr_boq_map(ssr: SsrTable, boq: BoqTable, boq_index: dict) -> dict:
+  """
+  BOQ item number for every SSR row, decided once per catalogue load:
+
+    a) same normalised description in BOQ
+    b) if multiple BOQ rows:
+        compare SSR.additional_specification (normalised)
+        with BOQ_Reference_Page No (normalised)
+        if equal → pick that BOQ item
+        else → fall back to first BOQ candidate.
+
+  Returns {"item_no": [...], "rule": [...]} by SSR row position. item_no
+  is "" if BOQ has no row with that description; rule says how it was
+  decided ("none", "single", "reference_page", "first_of_many").
+  """
+  item_nos, rules = [], []
+  for norm_ssr_desc, ssr_norm_add in zip(ssr.norm, ssr.norm_add_spec):
+      # a) Match by same normalised description
+      boq_candidates = boq_index["by_desc"].get(norm_ssr_desc)
+
+      if not boq_candidates:
+          item_nos.append("")
+          rules.append("none")
+          continue
+
+      if len(boq_candidates) == 1:
+          # single BOQ row with same description
+          item_nos.append(boq.item_no[boq_candidates[0]])
+          rules.append("single")
+          continue
+
+      # multiple BOQ rows with same description
+      # use SSR.additional_specification vs BOQ_Reference_Page No
+      matched = None
+      if ssr_norm_add:
+          matched = boq_index["by_desc_page"].get((norm_ssr_desc, ssr_norm_add))
+
+      if matched is not None:
+          item_nos.append(boq.item_no[matched])
+          rules.append("reference_page")
+      else:
+          # no exact match on extra columns / no additional_specification
+          # → fall back to first candidate
+          item_nos.append(boq.item_no[boq_candidates[0]])
+          rules.append("first_of_many")
+
+  return {"item_no": item_nos, "rule": rules}
+
+
+def _boq_item_for(catalog, best) -> str:
+  """BOQ item number for a matched SsrRow ("" if none), see _build_ssr_boq_map."""
+  return catalog.ssr_boq["item_no"][best.pos]
+
+
+def get_ssr_boq_mapping(include_unmapped: bool = False) -> dict:
+  """
+  The precomputed SSR row → BOQ item table of the current catalogue,
+  for auditing. Only rows with a rate (the only ones a match returns),
+  and by default only those that have a BOQ item.
+  """
+  catalog = catalogs.current()
+  ssr = catalog.ssr
+  mapping = catalog.ssr_boq
+
+  rated = np.flatnonzero(ssr.rate > 0).tolist()
+  items = []
+  for pos in rated:
+      if mapping["rule"][pos] == "none" and not include_unmapped:
+          continue
+      items.append({
+          "ssr_item_no": ssr.ssr_item_no[pos],
+          "reference_no": ssr.reference_no[pos],
+          "description": ssr.description[pos],
+          "additional_specification": ssr.additional_specification[pos],
+          "boq_item_no": mapping["item_no"][pos],
+          "rule": mapping["rule"][pos],
+      })
 
+  return {
+      "catalog_version": catalog.version,
+      "rules": dict(Counter(mapping["rule"][pos] for pos in rated)),
+      "items": items,
+  }
+
+
+def _resolve_match(catalog, pos, kind: str, score: float = 1.0):
+  """Turn a matched row position into (SsrRow, BOQ item no), counting it."""
+  _count_match(kind)
+  if pos is None:
+      # print("NO GOOD SSR MATCH, best_score:", score)
+      return None
+
+  best = catalog.ssr.row(pos)
+  if kind == "fuzzy":
       print(
-          f"FUZZY MATCH USED (JSON, score={best_score:.3f}): "
-          f"{best['_norm'][:80]} ..."
+          f"FUZZY MATCH USED (JSON, score={score:.3f}): "
+          f"{best.norm[:80]} ..."
       )
 
-  base = best["rate"]
-  if base <= 0:
+  if best.rate <= 0:
       # safety: if somehow rate is 0, consider as not usable
       return None
 
+  return best, _boq_item_for(catalog, best)
+
+
+def match_ssr_candidates(description: str, k: int = 5) -> list:
+  """
+  Up to k SSR rows for a description, best first, as
+  (SsrRow, boq_item_no, score, kind).
+
+  The row match_ssr picks by key comes first with kind "exact" /
+  "canonical" and score 1.0; the rest are the best fuzzy scores
+  (kind "fuzzy"), including ones below FUZZY_THRESHOLD so the user
+  can still pick a row.
+  """
+  query = _normalise(description)
+  if not query or k <= 0:
+      return []
+
+  catalog = catalogs.current()
+  picked = []
+  exact = _exact_position(catalog, query)
+  if exact is not None:
+      picked.append((exact[0], 1.0, exact[1]))
+
+  for pos, score in _fuzzy_top_positions(catalog, query, k):
+      if exact is None or pos != exact[0]:
+          picked.append((pos, score, "fuzzy"))
+
+  candidates = []
+  for pos, score, kind in picked[:k]:
+      row = catalog.ssr.row(pos)
+      candidates.append((row, _boq_item_for(catalog, row), score, kind))
+  return candidates
+
+
+def get_cache_stats() -> dict:
+  """Hit / miss / eviction counters of the match result cache."""
+  return _match_cache.stats()
+
+
+def get_coalescing_stats() -> dict:
+  """
+  Cache misses of match_ssr that ran a match ("computed") vs. joined an
+  identical one already running ("coalesced").
+  """
+  return _match_flights.stats()
+
+
+def _match_uncached(catalog, query: str):
+  exact = _exact_position(catalog, query)
+  if exact is not None:
+      return _resolve_match(catalog, *exact)
+
+  pos, score = _fuzzy_position(catalog, query)
+  kind = "fuzzy" if pos is not None else "not_found"
+  return _resolve_match(catalog, pos, kind, score)
+
+
+def match_ssr(description: str):
+  """
+  Quantity-independent part of fetch_ssr_rate: the matched SSR row and
+  its BOQ item number as (SsrRow, boq_item_no), or None if no SSR row is
+  acceptable. Served from the match result cache when possible; on a
+  miss, concurrent lookups of the same normalised description (and
+  catalogue version) share one computation.
+  """
+  query = _normalise(description)
+  if not query:
+      return None
+
+  hit, match = _match_cache.get(query)
+  if hit:
+      return match
+
+  catalog = catalogs.current()
+
+  def compute():
+      match = _match_uncached(catalog, query)
+      _match_cache.put(query, match, catalog.version)
+      return match
+
+  return _match_flights.do((catalog.version, query), compute)
+
+
+def match_ssr_batch(descriptions: list, workers: int = None) -> list:
+  """
+  match_ssr for many descriptions, results in input order.
+
+  Identical (normalised) descriptions are matched once and the match
+  result cache is shared with match_ssr. Exact/canonical hits are
+  resolved inline; when at least BATCH_PARALLEL_MIN descriptions
+  need a fuzzy scan they are spread over `workers` (default
+  BATCH_WORKERS) of the shared process pool (process_pool.py), which
+  load the same catalogue version themselves.
+  """
+  workers = BATCH_WORKERS if workers is None else workers
+  queries = [_normalise(d) for d in descriptions]
+  catalog = catalogs.current()
+
+  resolved = {"": None}
+  fuzzy_queries = []
+  for query in dict.fromkeys(queries):
+      if query in resolved:
+          continue
+      hit, match = _match_cache.get(query)
+      if hit:
+          resolved[query] = match
+          continue
+      exact = _exact_position(catalog, query)
+      if exact is not None:
+          resolved[query] = _resolve_match(catalog, *exact)
+          _match_cache.put(query, resolved[query], catalog.version)
+      else:
+          fuzzy_queries.append(query)
+
+  fuzzy_results = None
+  if workers > 1 and len(fuzzy_queries) >= BATCH_PARALLEL_MIN:
+      chunk_size = -(-len(fuzzy_queries) // (workers * 4))
+      chunks = [
+          fuzzy_queries[i:i + chunk_size]
+          for i in range(0, len(fuzzy_queries), chunk_size)
+      ]
+      results = process_pool.map(_fuzzy_positions, chunks, [catalog.sources] * len(chunks))
+      # a worker on another catalogue version → redo the batch here
+      if all(r is not None for r in results):
+          fuzzy_results = [r for chunk, _ in results for r in chunk]
+          for _, work in results:
+              _add_match_stats(work)
+
+  if fuzzy_results is None:
+      fuzzy_results = [_fuzzy_position(catalog, q) for q in fuzzy_queries]
+
+  for query, (pos, score) in zip(fuzzy_queries, fuzzy_results):
+      kind = "fuzzy" if pos is not None else "not_found"
+      resolved[query] = _resolve_match(catalog, pos, kind, score)
+      _match_cache.put(query, resolved[query], catalog.version)
+
+  return [resolved[q] for q in queries]
+
+
+def suggest_ssr(text: str, limit: int = 10) -> list:
+  """
+  Typeahead over the rated SSR rows: rows where every typed word starts
+  some word of the description (so the last, half-typed word works too).
+  Descriptions extracted without spaces are found through a substring
+  match on the canonical key.
+
+  Ranked: description starts with the text, then shorter descriptions,
+  then catalogue order.
+  """
+  query = _normalise(text)
+  typed = _WORD_RE.findall(query)
+  if not typed or limit <= 0:
+      return []
+
+  catalog = catalogs.current()
+  ssr = catalog.ssr
+  index = catalog.ssr_index
+  words = index["words"]
+  postings = index["word_postings"]
+  ptr = index["word_ptr"]
+
+  mask = np.ones(len(ssr), dtype=bool)
+  for word in typed:
+      lo = bisect.bisect_left(words, word)
+      hi = bisect.bisect_left(words, word + "\U0010ffff", lo)
+      hits = np.zeros(len(ssr), dtype=bool)
+      hits[postings[ptr[lo]:ptr[hi]]] = True
+      mask &= hits
+  found = set(np.flatnonzero(mask).tolist())
+
+  canon = _canonical(query)
+  if len(found) < limit and len(canon) >= 3:
+      keys, starts, rows, rows_ptr = catalog.derived("canon_keys", _build_canon_keys)
+      at = keys.find(canon)
+      while at != -1:
+          i = bisect.bisect_right(starts, at) - 1
+          found.update(rows[rows_ptr[i]:rows_ptr[i + 1]])
+          # next key: one hit per key is enough
+          at = keys.find(canon, starts[i + 1]) if i + 1 < len(starts) else -1
+
+  ranked = sorted(
+      found,
+      key=lambda pos: (
+          not ssr.norm[pos].startswith(query),
+          len(ssr.norm[pos]),
+          pos,
+      ),
+  )
+  return [
+      {
+          "ssr_item_no": ssr.ssr_item_no[pos],
+          "description": ssr.description[pos],
+          "unit": ssr.unit[pos],
+          "rate": float(ssr.rate[pos]),
+      }
+      for pos in ranked[:limit]
+  ]
+
+
+def rate_payload(best, boq_item_no: str, quantity: float = 1.0) -> dict:
+  """fetch_ssr_rate's response for a matched SsrRow and quantity."""
+  base = best.rate
+
   # ---- compute SSR amounts (same as before) ----
   gst = round(base * 0.05, 2)
   final = round(base + gst, 2)
   total = round(final * (quantity or 0.0), 2)
 
-  # ---- NEW PART: find BOQ item number using description + extra columns ----
-  boq_item_no = ""
-
-  if boq_data:
-      # a) Match by same normalised description
-      norm_ssr_desc = best["_norm"]
-      boq_candidates = [b for b in boq_data if b["_norm_desc"] == norm_ssr_desc]
-
-      if boq_candidates:
-          if len(boq_candidates) == 1:
-              # single BOQ row with same description
-              boq_item_no = boq_candidates[0]["boq_item_no"]
-          else:
-              # multiple BOQ rows with same description
-              # use SSR.additional_specification vs BOQ_Reference_Page No
-              ssr_norm_add = best.get("_norm_add_spec", "")
-
-              if ssr_norm_add:
-                  matched = None
-                  for b in boq_candidates:
-                      if b["_norm_ref_page"] == ssr_norm_add:
-                          matched = b
-                          break
-
-                  if matched:
-                      boq_item_no = matched["boq_item_no"]
-                  else:
-                      # no exact match on extra columns → fall back to first
-                      boq_item_no = boq_candidates[0]["boq_item_no"]
-              else:
-                  # no additional_specification in SSR → just use first candidate
-                  boq_item_no = boq_candidates[0]["boq_item_no"]
-
   # ---- return payload (same SSR fields + extra BOQ item no) ----
   return {
-      "ssr_item_no": best["ssr_item_no"],
-      "unit": best["unit"],
+      "ssr_item_no": best.ssr_item_no,
+      "unit": best.unit,
       "base_rate": base,
       "gst_rate": gst,
       "final_rate": final,
@@ -236,3 +1021,30 @@ def fetch_ssr_rate(description: str, quantity: float = 1.0):
       "boq_item_no": boq_item_no,  # may be "" if not found / no BOQ
       "non_ssr": False,            # still an SSR item; NON SSR = handled by None
   }
+
+
+def fetch_ssr_rate(description: str, quantity: float = 1.0):
+  """
+  Look up SSR rate by description using JSON data.
+
+  Strategy (SSR behaviour is EXACTLY your old logic):
+
+  1) Normalise user description.
+  2) EXACT normalised match (and rate > 0) → use that.
+     Else EXACT match on the canonical key (no spaces / punctuation),
+     if only one SSR item has that key.
+  3) If not found, FUZZY match with a SAFE THRESHOLD:
+       - shortlist candidate rows (trigram index, or TF-IDF cosine
+         when SSR_MATCH_ENGINE=tfidf)
+       - compute similarity on normalised text
+       - if best_score >= 0.80 and rate > 0 → use it
+       - else → treat as NOT FOUND → return None.
+  4) For SSR ITEM (match found):
+       - compute base_rate, gst_rate, final_rate, total_amount
+       - THEN find the BOQ item number (see _boq_item_for).
+  5) If nothing acceptable is found → return None (NON SSR handled by caller).
+  """
+  match = match_ssr(description)
+  if match is None:
+      return None
+  return rate_payload(*match, quantity)
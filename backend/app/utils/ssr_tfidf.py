@@ -0,0 +1,96 @@
+"""
+Character n-gram TF-IDF index over the SSR descriptions, an alternative
+way to shortlist rows for the fuzzy match. ssr_loader uses it instead of
+the trigram shortlist when SSR_MATCH_ENGINE=tfidf: SequenceMatcher only
+re-ranks the TFIDF_RERANK_SIZE rows with the highest cosine similarity.
+"""
+
+from collections import Counter
+
+import numpy as np
+
+
+def _char_ngrams(text: str, n: int = 3) -> Counter:
+    """Padded character n-gram counts of an already normalised string."""
+    padded = f"  {text} "
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+class TfidfIndex:
+    """
+    Character n-gram TF-IDF matrix over SSR descriptions.
+
+    The matrix is kept column-wise (CSC style, one slice of row ids and
+    weights per n-gram), which is all a query needs: scoring against the
+    whole catalogue is one gather + one np.bincount.
+
+    Weights are sublinear tf (1 + log tf) times smoothed idf, rows are
+    L2-normalised, so the score is the cosine similarity.
+    """
+
+    def __init__(self, texts: list[str]):
+        self.size = len(texts)
+
+        vocab = {}
+        rows, cols, counts = [], [], []
+        for row, text in enumerate(texts):
+            for gram, count in _char_ngrams(text).items():
+                rows.append(row)
+                cols.append(vocab.setdefault(gram, len(vocab)))
+                counts.append(count)
+
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        tf = np.asarray(counts, dtype=np.float32)
+
+        df = np.bincount(cols, minlength=len(vocab))
+        self.idf = (np.log((1 + self.size) / (1 + df)) + 1).astype(np.float32)
+
+        weights = (1 + np.log(tf)) * self.idf[cols]
+        row_norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=self.size))
+        row_norms[row_norms == 0] = 1.0
+        weights = (weights / row_norms[rows]).astype(np.float32)
+
+        order = np.argsort(cols, kind="stable")
+        self.col_rows = rows[order]
+        self.col_weights = weights[order]
+        self.col_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=self.col_ptr[1:])
+        self.vocab = vocab
+
+    def scores(self, text: str) -> np.ndarray:
+        """Cosine similarity of text against every row (float32 array)."""
+        cols, q_weights = [], []
+        for gram, count in _char_ngrams(text).items():
+            col = self.vocab.get(gram)
+            if col is not None:
+                cols.append(col)
+                q_weights.append((1 + np.log(count)) * self.idf[col])
+
+        if not cols:
+            return np.zeros(self.size, dtype=np.float32)
+
+        q_weights = np.asarray(q_weights, dtype=np.float32)
+        q_weights /= np.sqrt(np.dot(q_weights, q_weights))
+
+        cols = np.asarray(cols)
+        starts = self.col_ptr[cols]
+        lengths = self.col_ptr[cols + 1] - starts
+        # flat positions of every (row, weight) entry of the query's columns
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        flat = offsets + np.arange(lengths.sum())
+
+        return np.bincount(
+            self.col_rows[flat],
+            weights=self.col_weights[flat] * np.repeat(q_weights, lengths),
+            minlength=self.size,
+        )
+
+    def top(self, text: str, k: int) -> list[int]:
+        """Row ids of the k best-scoring rows (any order), zero scores dropped."""
+        scores = self.scores(text)
+        if k < self.size:
+            idx = np.argpartition(scores, -k)[-k:]
+        else:
+            idx = np.arange(self.size)
+        return [int(i) for i in idx if scores[i] > 0]
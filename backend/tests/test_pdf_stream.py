@@ -0,0 +1,107 @@
+"""
+PdfStreamWriter / StreamingCanvas (app/utils/pdf_stream.py) lean on
+reportlab internals, so the same documents are drawn buffered (a normal
+Canvas) and streamed here, and must read back as the same pages.
+
+Needs the packages of requirements-dev.txt (pypdf reads the PDFs back).
+"""
+
+import io
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from pypdf import PdfReader
+
+from app.utils import bill_pdf
+from app.utils.bill_layout import describe_material
+from app.utils.pdf_generator import InvoicePDFGenerator
+from app.utils.pdf_stream import PdfStreamWriter
+
+WORDS = ("providing laying excavation concrete reinforcement plastering "
+         "brick masonry cement mortar shuttering curing finishing").split()
+
+
+def page_texts(pdf: bytes) -> list:
+    return [page.extract_text() for page in PdfReader(io.BytesIO(pdf)).pages]
+
+
+def assert_same_pages(buffered: bytes, streamed: bytes):
+    expected = page_texts(buffered)
+    assert len(expected) > 1
+    assert page_texts(streamed) == expected
+
+
+@pytest.fixture(scope="module")
+def materials():
+    rows = []
+    for i in range(150):
+        # 1 to 6 wrapped description lines
+        description = " ".join(WORDS[(i + j) % len(WORDS)] for j in range(8 + i % 6 * 13))
+        qty = 1.5 + i
+        rate = 100.0 + 7 * i
+        rows.append(SimpleNamespace(
+            description=description,
+            boq_item_no=str(i + 1),
+            unit="cum",
+            quantity=qty,
+            base_rate=rate,
+            total_amount=round(qty * rate, 2),
+            **describe_material(description, str(i + 1)),
+        ))
+    return rows
+
+
+@pytest.mark.parametrize("use_forms", [True, False])
+def test_streamed_bill_matches_buffered(materials, use_forms):
+    buffer = io.BytesIO()
+    p = bill_pdf.canvas.Canvas(buffer, pagesize=bill_pdf.PAGE_SIZE)
+    bill = bill_pdf.MaterialsBill(p, use_forms=use_forms)
+    for m in materials:
+        bill.add_material(m)
+    bill.finish()
+    p.save()
+
+    streamed = b"".join(bill_pdf.stream_materials_bill(materials, use_forms=use_forms))
+    assert_same_pages(buffer.getvalue(), streamed)
+
+
+def test_joined_page_ranges_match_buffered(materials):
+    rows = [bill_pdf.bill_row(m) for m in materials]
+    grand_without_18 = 0.0
+    for row in rows:
+        grand_without_18 += row.amount
+
+    ranges = bill_pdf._split_ranges(rows, bill_pdf.page_starts(rows), 3)
+    assert len(ranges) == 3
+    totals = [None] * (len(ranges) - 1) + [grand_without_18]
+    joined = bill_pdf._join_ranges([bill_pdf._record_range(r, t) for r, t in zip(ranges, totals)])
+
+    assert_same_pages(bill_pdf.render_materials_bill(materials, workers=1), joined)
+
+
+@pytest.mark.parametrize("template_type", ["standard", "detailed", "simplified"])
+def test_recorded_invoice_matches_rendered(template_type):
+    items = [
+        {"description": f"Item {i} " + " ".join(WORDS[:i % 9]), "quantity": i + 1.0,
+         "unit": "sqm", "rate": 50.0, "amount": (i + 1) * 50.0}
+        for i in range(80)
+    ]
+    subtotal = sum(item["amount"] for item in items)
+    data = {
+        "invoice_number": "INV-00001",
+        "client_name": "Client",
+        "client_address": "Site",
+        "date": datetime(2024, 3, 31),
+        "items": items,
+        "subtotal": subtotal,
+        "gst_percentage": 18,
+        "gst_amount": round(subtotal * 0.18, 2),
+        "grand_total": round(subtotal * 1.18, 2),
+    }
+    generator = InvoicePDFGenerator()
+
+    writer = PdfStreamWriter()
+    writer.add_recorded(generator.record(data, template_type))
+    writer.close({})
+    assert_same_pages(generator.render(data, template_type), writer.take())
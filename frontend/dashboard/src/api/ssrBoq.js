@@ -28,3 +28,52 @@ export async function previewRate({ description, quantity }) {
     throw err;
   }
 }
+
+// Many BOQ lines in one request → [{ description, status_code, rate, detail }]
+// status_code 404 per line replaces the 404 response of previewRate.
+export async function previewRateBatch(lines) {
+  const res = await fetch(`${API_BASE}/ssr/rate/batch`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(
+      lines.map(({ description, quantity }) => ({ description, quantity }))
+    ),
+  });
+
+  if (!res.ok) {
+    const data = await res.json().catch(() => ({}));
+    throw new Error(data.detail || `Server error (${res.status})`);
+  }
+
+  return res.json();
+}
+
+// Top-k SSR rows for one description, best first →
+// [{ ssr_item_no, description, unit, ..., boq_item_no, score, match, accepted }]
+export async function fetchSsrCandidates({ description, quantity, k = 5 }) {
+  const res = await fetch(`${API_BASE}/ssr/candidates`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ description, quantity, k }),
+  });
+
+  if (!res.ok) {
+    const data = await res.json().catch(() => ({}));
+    throw new Error(data.detail || `Server error (${res.status})`);
+  }
+
+  return res.json();
+}
+
+// Typeahead → [{ ssr_item_no, description, unit, rate }], best first
+export async function suggestSsr(q, limit = 10) {
+  const params = new URLSearchParams({ q, limit: String(limit) });
+  const res = await fetch(`${API_BASE}/ssr/suggest?${params}`);
+
+  if (!res.ok) {
+    const data = await res.json().catch(() => ({}));
+    throw new Error(data.detail || `Server error (${res.status})`);
+  }
+
+  return res.json();
+}
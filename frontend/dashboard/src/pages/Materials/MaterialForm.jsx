@@ -1,6 +1,6 @@
 // src/pages/Materials/MaterialForm.jsx
-import React, { useEffect, useMemo, useState } from "react";
-import { previewRate } from "../../api/ssrBoq";
+import React, { useEffect, useMemo, useRef, useState } from "react";
+import { fetchSsrCandidates, previewRate, suggestSsr } from "../../api/ssrBoq";
 import {
   downloadSingleMaterialBillPdf,
   downloadSingleMaterialBillExcel,
@@ -24,6 +24,14 @@ export default function MaterialForm({ onClose, onSubmit }) {
   const [loadingRate, setLoadingRate] = useState(false);
   const [rateError, setRateError] = useState("");
 
+  // typeahead suggestions while the description is being typed
+  const [suggestions, setSuggestions] = useState([]);
+  // set when a listed item is picked, so its description isn't looked up again
+  const justPicked = useRef(false);
+
+  // closest SSR rows when the description has no accepted match
+  const [candidates, setCandidates] = useState([]);
+
   // NON SSR flag (from backend or derived)
   const [isNonSSR, setIsNonSSR] = useState(false);
 
@@ -70,6 +78,36 @@ export default function MaterialForm({ onClose, onSubmit }) {
     });
   }
 
+  // ---- SSR suggestions while typing (a pasted full description skips this) ----
+  useEffect(() => {
+    const q = description.trim();
+    if (justPicked.current) {
+      justPicked.current = false;
+      setSuggestions([]);
+      return;
+    }
+    if (q.length < 3 || q.length > 60) {
+      setSuggestions([]);
+      return;
+    }
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const items = await suggestSsr(q, 8);
+        if (!cancelled) setSuggestions(items);
+      } catch (err) {
+        console.error("Error fetching SSR suggestions:", err);
+        if (!cancelled) setSuggestions([]);
+      }
+    }, 150);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [description]);
+
   // ---- SSR / BOQ Rate fetch based on description + TOTAL quantity ----
   useEffect(() => {
     async function fetchRate() {
@@ -84,6 +122,7 @@ export default function MaterialForm({ onClose, onSubmit }) {
       setLoadingRate(true);
       setRateError("");
       setRateInfo(null);
+      setCandidates([]);
 
       try {
         // Call API with correct payload
@@ -119,6 +158,12 @@ export default function MaterialForm({ onClose, onSubmit }) {
           );
           setRateInfo(null);
           setIsNonSSR(false);
+          setCandidates(
+            await fetchSsrCandidates({
+              description: desc,
+              quantity: totalQuantity,
+            }).catch(() => [])
+          );
           return;
         }
 
@@ -276,6 +321,29 @@ export default function MaterialForm({ onClose, onSubmit }) {
           placeholder="Paste the item description here exactly as in SSR / BOQ..."
         />
 
+        {suggestions.length > 0 && (
+          <ul className="mt-1 max-h-48 overflow-y-auto rounded-lg border border-slate-700 bg-slate-800 text-[11px] text-slate-100">
+            {suggestions.map((s) => (
+              <li
+                key={`${s.ssr_item_no}-${s.description}`}
+                onClick={() => {
+                  // no effect run (and no flag) if it is already the text
+                  justPicked.current = s.description !== description;
+                  setDescription(s.description);
+                  setSuggestions([]);
+                }}
+                className="flex gap-2 px-3 py-1 cursor-pointer hover:bg-slate-700"
+              >
+                <span className="w-12 shrink-0 text-slate-400">{s.ssr_item_no}</span>
+                <span className="flex-1 truncate">{s.description}</span>
+                <span className="shrink-0 text-slate-400">
+                  {s.unit} · ₹{s.rate}
+                </span>
+              </li>
+            ))}
+          </ul>
+        )}
+
         {/* Measurement rows table */}
         <div className="mt-4">
           <div className="flex justify-between items-center mb-2">
@@ -428,6 +496,33 @@ export default function MaterialForm({ onClose, onSubmit }) {
             </div>
           )}
 
+          {rateError && candidates.length > 0 && (
+            <div className="mt-2">
+              <div className="text-slate-300 text-[11px] mb-1">
+                Closest SSR items (click to use):
+              </div>
+              <ul className="space-y-1">
+                {candidates.map((c) => (
+                  <li
+                    key={`${c.ssr_item_no}-${c.description}`}
+                    onClick={() => {
+                      justPicked.current = c.description !== description;
+                      setDescription(c.description);
+                    }}
+                    className="flex gap-2 rounded-lg px-2 py-1 cursor-pointer bg-slate-900 hover:bg-slate-700 text-[11px] text-slate-100"
+                  >
+                    <span className="w-12 shrink-0 text-slate-400">{c.ssr_item_no}</span>
+                    <span className="flex-1 truncate">{c.description}</span>
+                    <span className="shrink-0 text-slate-400">
+                      {c.boq_item_no ? `BOQ ${c.boq_item_no} · ` : ""}
+                      {Math.round(c.score * 100)}%
+                    </span>
+                  </li>
+                ))}
+              </ul>
+            </div>
+          )}
+
           {/* Show SSR / BOQ meta always when we have rateInfo */}
           {rateInfo && !rateError && (
             <div className="space-y-1 text-slate-200 mb-2">